@@ -13,6 +13,8 @@ from sklearn.pipeline import make_pipeline
 import numpy as np
 import pandas as pd  # data processing
 
+from tft.frames import impute, load_frame_db
+from tft.schema import apply_schema
 from utils.utils import *
 from utils.logger import logging
 
@@ -22,14 +24,6 @@ LEAGUE = 'challengers'
 LATEST_RELEASE = '12.12.450.4196'  # '12.12.450.4196'
 
 
-def impute(df):
-    for name in df.select_dtypes("number"):
-        df[name] = df[name].fillna(0)
-    for name in df.select_dtypes("object"):
-        df[name] = df[name].fillna("None")
-    return df
-
-
 class TFT_Challengers(BaseDataLoader):
     def __init__(self, data_path, shuffle, test_split, random_state, stratify, training, label_name):
         '''set data_path in configs if data localy stored'''
@@ -40,17 +34,15 @@ class TFT_Challengers(BaseDataLoader):
         # # Load unique matches id
         # Get all unique matches_id from assets dir
         raw_collection = db[f'{data_path}']
-        raw_df = pd.DataFrame(list(raw_collection.find()))
+        raw_df = load_frame_db(raw_collection)
 
         # Clean up dataset
-        raw_df = impute(raw_df)
+        raw_df = apply_schema(impute(raw_df), truncate_levels=True)
         X = raw_df.drop(['match_id','_id'], axis=1)
         y = X.pop(label_name)
-        X.fillna('', inplace=True)
         numeric_cols = X.select_dtypes(include=np.number).columns.tolist()
         categorical_cols = X.select_dtypes(
             include=['object', 'category']).columns.tolist()
-        X[numeric_cols] = X[numeric_cols].applymap(np.int64)
 
         # traits level columns
         traits_col: list = [s for s in numeric_cols if "Set7" in s]
@@ -64,8 +56,12 @@ class TFT_Challengers(BaseDataLoader):
         # Feature engineering
         X[f'items_count'] = X[items_col].apply(
             lambda row: sum(x != 'None' for x in row), axis=1)
-        X[f'traits_sum'] = X[traits_col].sum(axis=1)
-        X[f'units_sum'] = X[units_col].sum(axis=1)
+        X[f'traits_sum'] = X[traits_col].sum(axis=1).astype(np.int64)
+        X[f'units_sum'] = X[units_col].sum(axis=1).astype(np.int64)
+
+        # Loader contract: int64 label and '' filled string features, the compact dtypes stay internal
+        y = y.astype(np.int64)
+        X[categorical_cols] = X[categorical_cols].astype(object).fillna('')
 
         # one_hot_encoder = OneHotEncoder(handle_unknown="ignore", sparse=False)
         # preproc = StandardScaler()
@@ -4,103 +4,31 @@
 import argparse
 import asyncio
 import collections
+import re
 from datetime import date, datetime, timedelta
 
 from pymongo import MongoClient, DESCENDING
 
 # from tft.api import *
+from tft.flattener import MatchFlattener
+from tft.frames import impute, load_frame_db
+from tft.schema import apply_schema
+from tft.snapshot import PARQUET, write_snapshot
 from utils.parse_config import ConfigParser
 from utils.logger import logging
 from utils.utils import *
 from utils.configuration import settings
 import os.path
 
-import pandas as pd
 import numpy as np
 
 
 # # Config
 TARGETNAME: str = settings.targetname  # 'placement'
-
-
-def handle_nas(df, default_date='2020-01-01'):
-    """
-    :param df: a dataframe
-    :param d: current iterations run_date
-    :return: a data frame with replacement of na values as either 0 for numeric fields, 'None' for text and False for bool
-    """
-    numeric_cols: list = df.select_dtypes(include=np.number).columns.tolist()
-    categorical_cols: list = df.select_dtypes(
-        include=['object', 'category']).columns.tolist()
-
-    for f in df.columns:
-
-        # integer
-        if f in numeric_cols:
-            df[f] = df[f].fillna(0)
-
-        # dates
-        elif df[f].dtype == '<M8[ns]':
-            df[f] = df[f].fillna(pd.to_datetime(default_date))
-
-        # boolean
-        elif df[f].dtype == 'bool':
-            df[f] = df[f].fillna(False)
-
-        # string
-        elif f in categorical_cols:
-            df[f] = df[f].fillna('None')
-
-    return df
-
-
-async def process_matches(df) -> list[dict]:
-    matches_array: list = []
-
-    for match_row in df:
-
-        match_id: str = match_row['metadata']['match_id']
-
-        for participant in match_row['info']['participants']:
-            match: dict = {}
-            # db unique id
-            match['_id'] = match_id + '-' + participant['puuid']
-            match['match_id'] = match_id
-            # match['level'] = participant['level']
-            match['placement'] = participant['placement']
-            # match['players_eliminated'] = participant['players_eliminated']
-            # match['total_damage_to_players'] = participant['total_damage_to_players']
-
-            for augment_index, augment in enumerate(participant['augments']):
-                match[f'augment{augment_index}'] = augment
-
-            for _, trait in enumerate(participant['traits']):
-                match[f'{trait["name"]}'] = (
-                    trait["tier_current"] / trait["tier_total"]) * 12
-
-            for _, unit in enumerate(participant['units']):
-                tier: int = unit["tier"]
-                rarity: int = unit["rarity"]
-                # if match[f'{unit["character_id"]}']: # Double or more units
-                #     match[f'{unit["character_id"]}'] += tier * rarity
-                # else:
-                match[f'{unit["character_id"]}'] = tier * rarity
-                # match['TFT7b_Heimerdinger_item0'] = 'None'
-                # match['TFT7b_Heimerdinger_item1'] = 'None'
-                # match['TFT7b_Heimerdinger_item2'] = 'None'
-                # match['TFT7b_Lulu_item0'] = 'None'
-                # match['TFT7b_Lulu_item1'] = 'None'
-                # match['TFT7b_Lulu_item2'] = 'None'
-                # match['TFT7b_Tristana_item0'] = 'None'
-                # match['TFT7b_Tristana_item1'] = 'None'
-                # match['TFT7b_Tristana_item2'] = 'None'
-                for item_index, item in enumerate(unit['itemNames']):
-                    match[f'{unit["character_id"]}_item{item_index}'] = item.split(
-                        '_')[-1]
-
-            matches_array.append(match)
-
-    return matches_array
+# Units and traits of https://raw.communitydragon.org/latest/cdragon/tft/en_us.json, the flattener vocabulary
+TFT_ASSETS: dict = read_json(os.path.join(ASSETS_DIR, "en_us.json"))
+# Parquet or Arrow snapshots of the output datasets, one directory each
+SNAPSHOT_DIR: str = os.path.join(ASSETS_DIR, 'snapshots')
 
 
 def reorder_df_col(df):
@@ -113,7 +41,26 @@ def reorder_df_col(df):
     return df.reindex(columns=fixed_cols + sorted(to_sort_cols))
 
 
-async def start_tft_data_egress(server: str, league: str, latest_release: str, ranked_id: int, patch: str, save_csv: bool):
+def window_columns(df, rows):
+    """Columns of a window of rows, as if it was flattened alone.
+
+    Columns without any value in the window are dropped, except reorder_df_col fixed ones.
+
+    Args:
+        df (DataFrame): Flattened matches, before impute.
+        rows (ndarray): Boolean mask of the window rows.
+
+    Returns:
+        Index: Window columns, in df order.
+    """
+    fixed_cols = ['placement', 'match_id',
+                  'augment0', 'augment1', 'augment2']
+    return df.columns[df.loc[rows].notna().any().to_numpy() | df.columns.isin(fixed_cols)]
+
+
+async def start_tft_data_egress(server: str, league: str, latest_release: str, ranked_id: int, patch: str, save_csv: bool,
+                                incremental: bool = False, save_snapshot: bool = False,
+                                snapshot_format: str = PARQUET):
     # config to process
     SERVER: str = server
     LEAGUE: str = league
@@ -131,83 +78,102 @@ async def start_tft_data_egress(server: str, league: str, latest_release: str, r
         f'# Starting {SERVER}_{LEAGUE}_{LATEST_RELEASE}_{PATCH} loading.')
 
     summoners_collection = db[f'{SERVER}_{LEAGUE}_summoners']
-    summoners_df = pd.DataFrame(list(summoners_collection.find()))
+    summoners_df = load_frame_db(summoners_collection, columns=['puuid'])
     # # Load unique matches id
-    # Get all unique matches_id from assets dir {'game_version': {'$regex': LATEST_RELEASE}}
+    # Filters run by Mongo, only matches of LATEST_RELEASE in any window below are loaded
     matches_detail_collection = db[SERVER + '_' + 'matches_detail']
-    matches_asset: list = load_league_matches_db(
-        collection=matches_detail_collection, summoners_df=summoners_df)
+    ensure_matches_indexes_db(matches_detail_collection)
+    # game_datetime cutoffs in ms, local time like date.fromtimestamp
+    PATCH_START: datetime = datetime.combine(PATCH, datetime.min.time())
+    PATCH_DATETIME: int = int(PATCH_START.timestamp() * 1000)
+    THREEDAY_DATETIME: int = int(
+        max(datetime.now() - timedelta(days=3), PATCH_START).timestamp() * 1000)
+    matches_query: dict = {'info.game_version': {'$regex': re.escape(LATEST_RELEASE)},
+                           '$or': [{'info.queue_id': RANKED_ID},
+                                   {'info.game_datetime': {'$gte': PATCH_DATETIME}}]}
+
+    def match_windows(matches: list) -> list:
+        """Output collection, match flags and CSV export of each window.
+
+        Windows: LATEST_RELEASE RANKED_ID games, since last patch and last 3 days.
+        """
+        queue_ids = np.array([match['info']['queue_id'] for match in matches], dtype=np.int64)
+        game_datetimes = np.array([match['info']['game_datetime'] for match in matches], dtype=np.int64)
+        return [(f'{SERVER}_{LEAGUE}_{LATEST_RELEASE}_matches', queue_ids == RANKED_ID, False),
+                # Since last patch matches
+                (f'{SERVER}_{LEAGUE}_{LATEST_RELEASE}_{PATCH}_matches', game_datetimes >= PATCH_DATETIME, True),
+                # Last 3 days matches
+                (f'{SERVER}_{LEAGUE}_{LATEST_RELEASE}_3days_matches', game_datetimes >= THREEDAY_DATETIME, True)]
+
+    # Match ids already flattened into each window collection, none when rewriting them
+    flattened: dict = collections.defaultdict(set)
+    if incremental:
+        # Window of every league match from its id, queue and time only
+        candidates: list = load_league_matches_db(
+            collection=matches_detail_collection, summoners_df=summoners_df,
+            select={'info.queue_id': 1, 'info.game_datetime': 1}, query=matches_query)
+        candidates_id = np.array([match['_id'] for match in candidates], dtype=object)
+        new_matches = np.zeros(len(candidates), dtype=bool)
+        for name, match_flags, _ in match_windows(candidates):
+            in_window: set = set(candidates_id[match_flags])
+            db[name].create_index([("match_id", DESCENDING)])
+            flattened[name] = set(db[name].distinct('match_id'))
+            # Expire rows out of the window: older than 3 days, summoner left the league...
+            expired: list = list(flattened[name] - in_window)
+            if expired:
+                delete_matches_db(db[name], expired)
+            flattened[name] &= in_window
+            new_matches |= match_flags & ~np.isin(candidates_id, list(flattened[name]))
+            logging.info(f'{name}: {len(expired)} expired, {len(in_window) - len(flattened[name])} new matches.')
+        matches_asset: list = load_matches_by_id_db(
+            collection=matches_detail_collection, ids=candidates_id[new_matches].tolist())
+    else:
+        matches_asset: list = load_league_matches_db(
+            collection=matches_detail_collection, summoners_df=summoners_df, query=matches_query)
     logging.info(
         f'Loaded {SERVER}_{LEAGUE}_{LATEST_RELEASE}_{PATCH}: {len(matches_asset)}.')
 
-    matches_id = [match['metadata']['match_id'] for match in matches_asset]
-    seen = set()
-    uniq_matches_id = [
-        x for x in matches_id if x not in seen and not seen.add(x)]
-
-    logging.info(f'uniq_matches_id: {len(uniq_matches_id)}')
-    logging.info(f'matches_asset: {len(matches_asset)}')
-
-    # Filter for unique matches
-    seen = set()
-    seen_add = seen.add
-    uniq_matches = [x for x in matches_asset if x['metadata']['match_id']
-                    not in seen and not seen_add(x['metadata']['match_id'])]
+    # ## Window flags of each match, minus the ones already flattened in the window
+    matches_id = np.array([match['_id'] for match in matches_asset], dtype=object)
+    windows: list = [(name, match_flags & ~np.isin(matches_id, list(flattened[name])), to_csv)
+                     for name, match_flags, to_csv in match_windows(matches_asset)]
+    participants_count = np.array([len(match['info']['participants']) for match in matches_asset], dtype=np.int64)
+    for name, match_flags, _ in windows:
+        logging.info(f'{name}: {match_flags.sum()}')
 
+    # # Process api details to datasets rows, once per match whatever its windows
+    matches_league_df = MatchFlattener.from_assets(TFT_ASSETS).flatten(matches_asset)
     del matches_asset
-    logging.info(f'uniq_matches: {len(uniq_matches)}')
-
-    # ## Filter by LATEST_RELEASE version and RANKED_ID game.
-    latest_matches = [match for match in uniq_matches if (LATEST_RELEASE in match['info']['game_version']) and (
-        RANKED_ID == match['info']['queue_id'])]
-    # Since last patch matches
-    latest_patch_matches = [match for match in uniq_matches if (LATEST_RELEASE in match['info']['game_version'])
-                            and (PATCH <= date.fromtimestamp(match['info']['game_datetime']/1000.0))]
-    # Last 3 days matches
-    latest_3d_matches = [match for match in uniq_matches if (LATEST_RELEASE in match['info']['game_version'])
-                         and ((datetime.now() - timedelta(days=3)) <= datetime.fromtimestamp(match['info']['game_datetime']/1000.0))
-                         and (PATCH <= date.fromtimestamp(match['info']['game_datetime']/1000.0))]
-
-    del uniq_matches
-    logging.info(f'latest_matches: {len(latest_matches)}')
-    logging.info(f'latest_patch_matches: {len(latest_patch_matches)}')
-    logging.info(f'latest_3d_matches: {len(latest_3d_matches)}')
-
-    # # Process api details to datasets rows
-    matches_array = await process_matches(latest_matches)
-    matches_patch_array = await process_matches(latest_patch_matches)
-    matches_3d_array = await process_matches(latest_3d_matches)
-
-    # Normalize dict to dataframe
-    matches_league_df = pd.json_normalize(matches_array)
-    matches_league_patch_df = pd.json_normalize(matches_patch_array)
-    matches_league_3d_df = pd.json_normalize(matches_3d_array)
 
     # ## Sort and reorder columns
     matches_league_df = reorder_df_col(matches_league_df)
-    matches_league_patch_df = reorder_df_col(matches_league_patch_df)
-    matches_league_3d_df = reorder_df_col(matches_league_3d_df)
-
-    # Cleanup NaN
-    matches_league_df = handle_nas(matches_league_df)
-    matches_league_patch_df = handle_nas(matches_league_patch_df)
-    matches_league_3d_df = handle_nas(matches_league_3d_df)
-
-    # # Output dataframes
-    matches_collection = db[f'{SERVER}_{LEAGUE}_{LATEST_RELEASE}_matches']
-    # matches_collection.create_index([("match_id", DESCENDING)])
-    write_collection_db(
-        matches_league_df.to_dict('records'), collection=matches_collection, update=False)
-    write_collection_db(
-        matches_league_patch_df.to_dict('records'), collection=db[f'{SERVER}_{LEAGUE}_{LATEST_RELEASE}_{PATCH}_matches'], update=False)
-    write_collection_db(
-        matches_league_3d_df.to_dict('records'), collection=db[f'{SERVER}_{LEAGUE}_{LATEST_RELEASE}_3days_matches'], update=False)
-
-    if save_csv:
-        matches_league_patch_df.to_csv(os.path.join(
-            ASSETS_DIR, f'{SERVER}_{LEAGUE}_{LATEST_RELEASE}_{PATCH}_matches.csv'), index=False)
-        matches_league_3d_df.to_csv(os.path.join(
-            ASSETS_DIR, f'{SERVER}_{LEAGUE}_{LATEST_RELEASE}_3days_matches.csv'), index=False)
+
+    # Rows and columns of each window, a participant row is in its match windows
+    windows_rows: list = []
+    for name, match_flags, to_csv in windows:
+        rows = np.repeat(match_flags, participants_count)
+        windows_rows.append((name, rows, window_columns(matches_league_df, rows), to_csv))
+
+    # Cleanup NaN, compact dtypes
+    matches_league_df = apply_schema(impute(matches_league_df))
+
+    # # Output dataframes, slices of the one flattened frame
+    for name, rows, columns, to_csv in windows_rows:
+        window_df = matches_league_df.loc[rows, columns]
+        if incremental:  # Add the new rows, the collection is never emptied
+            upsert_collection_db(window_df.to_dict('records'), collection=db[name])
+        else:
+            write_collection_db(
+                window_df.to_dict('records'), collection=db[name], update=False)
+        if (save_csv and to_csv) or save_snapshot:
+            if incremental:  # Whole window
+                window_df = apply_schema(impute(reorder_df_col(load_frame_db(db[name]))))
+            if save_csv and to_csv:
+                window_df.to_csv(os.path.join(ASSETS_DIR, f'{name}.csv'), index=False)
+            if save_snapshot:
+                write_snapshot(window_df, name, SNAPSHOT_DIR, file_format=snapshot_format,
+                               metadata={'server': SERVER, 'league': LEAGUE, 'latest_release': LATEST_RELEASE,
+                                         'patch': patch})
     # matches_league_patch_df.iloc[[0]].to_json(os.path.join(
     #     ASSETS_DIR, f'{SERVER}_{LEAGUE}_{LATEST_RELEASE}_{PATCH}_matches.json'))
 
@@ -224,9 +190,13 @@ async def main(config: ConfigParser) -> None:
     ranked_id: int = config["ranked_id"]
     patch: str = config["patch"]
     save_csv: bool = config["save_csv"]
+    incremental: bool = config.config.get("incremental_load", False)
+    save_snapshot: bool = config.config.get("save_snapshot", False)
+    snapshot_format: str = config.config.get("snapshot_format", PARQUET)
 
     tasks = [asyncio.create_task(start_tft_data_egress(
-        server=server, league=league, latest_release=latest_release, ranked_id=ranked_id, patch=patch, save_csv=save_csv)) for server in servers]
+        server=server, league=league, latest_release=latest_release, ranked_id=ranked_id, patch=patch, save_csv=save_csv,
+        incremental=incremental, save_snapshot=save_snapshot, snapshot_format=snapshot_format)) for server in servers]
 
     done, pending = await asyncio.wait(tasks, timeout=900, return_when=asyncio.ALL_COMPLETED)
     logging.info(f'Done task count: {len(done)}')
@@ -255,6 +225,10 @@ if __name__ == '__main__':
                    target='league'),
         CustomArgs(['-v', '--save_csv'], type=bool,
                    target='save_csv'),
+        CustomArgs(['-i', '--incremental_load'], type=bool,
+                   target='incremental_load'),
+        CustomArgs(['-p', '--save_snapshot'], type=bool,
+                   target='save_snapshot'),
     ]
     config = ConfigParser.from_args(args, options)
 
@@ -1,18 +1,22 @@
 import argparse
 import asyncio
 import collections
+import time
 
-import json
-from typing import Dict, List
+from typing import List
 
 import pandas as pd
 from pandas import DataFrame
-
-from pymongo import MongoClient
-
-from pantheon import pantheon
-
+from pantheon.utils import exceptions as exc
+
+from tft.client import close_clients, get_client
+from tft.executor import RequestExecutor
+from tft.fetch_pipeline import FetchPipeline, map_bounded
+from tft.frames import load_frame_db
+from tft.rate_limiter import RateLimiter
+from tft.scheduler import PollScheduler
 from utils.configuration import settings
+from utils.journal import ScrapeJournal
 from utils.parse_config import ConfigParser
 from utils.logger import logging
 from utils.utils import *
@@ -25,6 +29,20 @@ API_KEY: str = settings.api_key
 # LEAGUE = 'challengers'  # ['challengers', 'grandmasters']
 
 MAX_COUNT: int = 30
+FETCH_WORKERS: int = 8  # concurrent match detail requests per server
+SUMMONER_WORKERS: int = 8  # concurrent summoner matchlist requests per server
+BATCH_SIZE: int = 50  # matches per insert into matches_detail
+# Daemon mode cadences, in seconds
+LEAGUE_INTERVAL: int = 1800  # ladder refresh
+POLL_MIN_INTERVAL: int = 120  # matchlist poll of the most active summoners
+POLL_MAX_INTERVAL: int = 3600  # matchlist poll of idle summoners
+# SummonerDTO fields stored along the ladder entries in {server}_{league}_summoners
+SUMMONER_FIELDS: list = ['accountId', 'puuid', 'name',
+                         'profileIconId', 'revisionDate', 'summonerLevel']
+
+# Shared by every server task of this process, see `main`.
+rate_limiter = RateLimiter(app_limits=settings.app_rate_limits)
+executor = RequestExecutor(rate_limiter)
 
 
 def requestsLog(url, status, headers):
@@ -32,87 +50,163 @@ def requestsLog(url, status, headers):
     logging.debug(headers)
 
 
-async def start_tft_fetch(load_new: bool, server: str, league: str, max_count: int
-                          ):
+async def start_tft_fetch(load_new: bool, server: str, league: str, max_count: int,
+                          fetch_workers: int = FETCH_WORKERS, batch_size: int = BATCH_SIZE,
+                          summoner_workers: int = SUMMONER_WORKERS, incremental: bool = True,
+                          resume: bool = False, daemon: bool = False,
+                          league_interval: int = LEAGUE_INTERVAL,
+                          poll_min_interval: int = POLL_MIN_INTERVAL,
+                          poll_max_interval: int = POLL_MAX_INTERVAL):
     LOAD_NEW: bool = load_new
     SERVER: str = server
     LEAGUE: str = league
     MAX_COUNT: int = max_count
 
-    client = MongoClient(settings.db_uri)
-    db = client[settings.db_name]
+    # Mongo and Riot clients are shared by every task of the process
+    db = get_mongo_client(settings.db_uri)[settings.db_name]
 
-    # create Patheon object to 1 server API key
-    panth = pantheon.Pantheon(
+    # Patheon object of 1 server API key
+    panth = get_client(
         SERVER, API_KEY, requests_logging_function=requestsLog, debug=True)
 
     async def getSummonerId(name):
         try:
-            data = await panth.get_tft_summoner_by_name(name)
+            data = await executor.call(SERVER, 'get_tft_summoner_by_name', panth.get_tft_summoner_by_name, name)
             return (data['id'], data['accountId'], data['puuid'])
         except Exception as e:
             logging.error(e)
 
-    async def getTFTRecentMatchlist(puuid, count=MAX_COUNT):
+    async def getTFTRecentMatchlist(puuid, count=MAX_COUNT, startTime=None):
         try:
-            data: List[str] = await panth.get_tft_matchlist(puuid, count=count)
+            data: List[str] = await executor.call(SERVER, 'get_tft_matchlist', panth.get_tft_matchlist, puuid, count=count, startTime=startTime)
             return data
         except Exception as e:
             logging.error(e)
-            return []
+            return None
 
-    async def getTFTRecentMatches(puuid, uniq_matches_id=[]):
+    async def getTFTMatch(matchId):
         try:
-            matchlist = await getTFTRecentMatchlist(puuid)
-            # Get only unique new matches from left hand side
-            new_matchlist: set = set(matchlist) - set(uniq_matches_id)
-            logging.info(f'Fetching ** {len(new_matchlist)} ** new matches')
+            return await executor.call(SERVER, 'get_tft_match', panth.get_tft_match, matchId)
+        except exc.NotFound:
+            # Gone for good, drop it instead of fetching it again every run
+            logging.warning(f'{matchId}: not found, dropped from the journal')
+            await asyncio.to_thread(journal.matches_done, [matchId])
+            return None
 
-            tasks: list = [panth.get_tft_match(match)
-                           for match in new_matchlist]
-            # Extend new matches
-            uniq_matches_id.extend(new_matchlist)
+    async def getTFTRecentMatches(puuid, fetch_pipeline, seen_matches_id: set, cursor: dict = {}, games: int = None):
+        """Queue the unseen and unstored matches of a summoner's recent matchlist.
 
-            matches: tuple = await asyncio.gather(*tasks)
+        Returns:
+            int: Games of the summoner since its cursor, None when skipped by its games count.
+        """
+        try:
+            # Skip summoners without ranked games since their last request
+            if games is not None and cursor.get('games') == games:
+                return None
+            # Only ask for games newer than the last one already stored
+            startTime = None
+            if 'game_datetime' in cursor:
+                startTime = cursor['game_datetime'] // 1000 + 1
+            matchlist = await getTFTRecentMatchlist(puuid, startTime=startTime)
+            if matchlist is None:
+                return 0
+            # Games of the summoner since the last matchlist, newest first, even if
+            # a lobby-mate already queued them. PollScheduler paces on these.
+            own_games: int = matchlist.index(cursor['match_id']) \
+                if cursor.get('match_id') in matchlist else len(matchlist)
+            # Get only matches unseen in this run. Claimed before any await, so
+            # summoners running concurrently never queue the same match twice.
+            new_matchlist: list = [
+                match for match in matchlist if match not in seen_matches_id]
+            seen_matches_id.update(new_matchlist)
+            # Then drop the ones already stored, one indexed lookup per matchlist
+            if new_matchlist:
+                stored: set = await asyncio.to_thread(
+                    find_existing_ids_db, matches_detail_collection, new_matchlist)
+                new_matchlist = [
+                    match for match in new_matchlist if match not in stored]
+            logging.info(f'Fetching ** {len(new_matchlist)} ** new matches')
 
-            return matches if matches is not None else [], uniq_matches_id
+            # Checkpoint before fetching, so a crash leaves them pending
+            await asyncio.to_thread(journal.add_pending_matches, new_matchlist)
+            # Waits here while the fetch workers are busy
+            for match in new_matchlist:
+                await fetch_pipeline.put(match)
+            await asyncio.to_thread(journal.summoner_done, puuid)
+            # Matchlists are newest first
+            await asyncio.to_thread(set_cursor_db, cursors_collection, puuid,
+                                    match_id=matchlist[0] if matchlist else None, games=games)
+
+            return own_games
         except Exception as e:
             logging.error(e)
-            return [], uniq_matches_id
+            return 0
+
+    def writeMatches(matches_detail):
+        # db unique id
+        for match in matches_detail:
+            match['_id'] = match['metadata']['match_id']
+
+        written: list = insert_collection_db(
+            matches_detail, collection=matches_detail_collection)
+        # Matches not written stay pending in the journal, the pipeline retries them
+        journal.matches_done(written)
+        if len(written) < len(matches_detail):
+            raise RuntimeError(f'{len(matches_detail) - len(written)} matches not written')
 
     async def getTFTChallengerLeague():
         try:
-            data = await panth.get_tft_challenger_league()
+            data = await executor.call(SERVER, 'get_tft_challenger_league', panth.get_tft_challenger_league)
             return data
         except Exception as e:
             logging.error(e)
 
     async def getTFTGrandmasterLeague():
         try:
-            data = await panth.get_tft_grandmaster_league()
+            data = await executor.call(SERVER, 'get_tft_grandmaster_league', panth.get_tft_grandmaster_league)
             return data
         except Exception as e:
             logging.error(e)
 
     async def getTFTMasterLeague():
         try:
-            data = await panth.get_tft_master_league()
+            data = await executor.call(SERVER, 'get_tft_master_league', panth.get_tft_master_league)
             return data
         except Exception as e:
             logging.error(e)
 
     async def getTFT_Summoner(summonerId):
         try:
-            data = await panth.get_tft_summoner(summonerId)
+            data = await executor.call(SERVER, 'get_tft_summoner', panth.get_tft_summoner, summonerId)
             return data
         except Exception as e:
             logging.error(e)
 
-    async def get_league(league='challengers'):
+    async def getTFTLeague(league='challengers'):
+        match league:
+            case 'challengers':
+                getTFTLeagueFunc = getTFTChallengerLeague
+            case 'grandmasters':
+                getTFTLeagueFunc = getTFTGrandmasterLeague
+            case 'masters':
+                getTFTLeagueFunc = getTFTMasterLeague
+            case _:
+                # 0 is the default case if x is not found
+                getTFTLeagueFunc = getTFTChallengerLeague
+
+        return await getTFTLeagueFunc()
+
+    async def getSummonerDetail(summonerId, known: dict = {}):
+        if summonerId in known:
+            return known[summonerId]
+        return await getTFT_Summoner(summonerId)
+
+    async def get_league(league='challengers', known: dict = {}):
         """Get league's summoners details.
 
         Args:
             league (str, optional): TFT league. Defaults to 'challengers'.
+            known (dict, optional): Summoner details by summonerId, not requested again. Defaults to {}.
 
         Returns:
             Dataframe: Dataframe of league's summoners details.
@@ -143,24 +237,13 @@ async def start_tft_fetch(load_new: bool, server: str, league: str, max_count: i
                                 target 	int 	
                                 wins 	int 
         """
-        match league:
-            case 'challengers':
-                getTFTLeagueFunc = getTFTChallengerLeague
-            case 'grandmasters':
-                getTFTLeagueFunc = getTFTGrandmasterLeague
-            case 'masters':
-                getTFTLeagueFunc = getTFTMasterLeague
-            case _:
-                # 0 is the default case if x is not found
-                getTFTLeagueFunc = getTFTChallengerLeague
+        summoners = await getTFTLeague(league)
 
-        summoners = await getTFTLeagueFunc()
-
-        summoners_league: List = json.loads('[]')
-        for _, summoner in enumerate(summoners['entries'][:]):
-            summoner_detail = await getTFT_Summoner(summoner['summonerId'])
-            if summoner_detail != None:
-                summoners_league.append(summoner_detail)
+        summoners_detail: List = await map_bounded(
+            lambda summoner: getSummonerDetail(summoner['summonerId'], known=known),
+            summoners['entries'], workers=summoner_workers)
+        summoners_league: List = [
+            summoner_detail for summoner_detail in summoners_detail if summoner_detail != None]
 
         summoners_league_df = pd.json_normalize(summoners_league)
         summoners_df = pd.json_normalize(summoners['entries'])
@@ -168,49 +251,164 @@ async def start_tft_fetch(load_new: bool, server: str, league: str, max_count: i
         return summoners_league_df.merge(
             summoners_df, left_on='id', right_on='summonerId')
 
+    async def refresh_league():
+        """Reload the league ladder, requesting only summoners new to it.
+
+        Returns:
+            dict: Ranked games count (wins + losses) by puuid, None if the ladder request failed.
+        """
+        known: dict = {summoner.pop('_id'): summoner for summoner in
+                       summoners_collection.find({}, SUMMONER_FIELDS)}
+        for summonerId, summoner in known.items():
+            summoner['id'] = summonerId
+        try:
+            summoners_df: DataFrame = await get_league(league=LEAGUE, known=known)
+        except Exception as e:  # ladder request failed, keep the current one
+            logging.error(e)
+            return None
+        summoners_df = summoners_df.rename(columns={'id': '_id'})
+        upsert_collection_db(
+            summoners_df.to_dict('records'), collection=summoners_collection, prune=True)
+        return {summoner['puuid']: summoner['wins'] + summoner['losses']
+                for summoner in summoners_df[['puuid', 'wins', 'losses']].to_dict('records')}
+
+    async def queue_pending_matches(matches_id, fetch_pipeline) -> int:
+        """Queue journal pending matches for a fetch, the ones already stored are marked done.
+
+        Returns:
+            int: Number of matches queued.
+        """
+        matches_id = list(matches_id)
+        stored: set = await asyncio.to_thread(find_existing_ids_db, matches_detail_collection, matches_id)
+        await asyncio.to_thread(journal.matches_done, list(stored))
+        queued: int = 0
+        for match in matches_id:
+            if match not in stored:
+                await fetch_pipeline.put(match)
+                queued += 1
+        return queued
+
+    async def poll_league(puuids: list, games: dict, fetch_pipeline, seen_matches_id: set):
+        """Daemon mode, never returns: poll matchlists as summoners fall due and
+        refresh the ladder every `league_interval` seconds.
+
+        Summoners finding new games are polled more often, see PollScheduler, and
+        the ones whose ladder games count went up are polled at once.
+        """
+        scheduler = PollScheduler(min_interval=poll_min_interval, max_interval=poll_max_interval)
+        for puuid in puuids:
+            scheduler.schedule(puuid)
+        # A freshly loaded ladder is good for a while, a cached one is refreshed at once
+        ladder_due: float = time.monotonic() + (league_interval if LOAD_NEW else 0)
+        while True:
+            if time.monotonic() >= ladder_due:
+                ladder_due = time.monotonic() + league_interval
+                ladder_games: dict = await refresh_league()
+                if ladder_games is not None:
+                    for puuid in set(games) - set(ladder_games):
+                        scheduler.remove(puuid)
+                    for puuid, count in ladder_games.items():
+                        if puuid not in scheduler or games.get(puuid) != count:
+                            scheduler.bump(puuid)
+                    games = ladder_games
+                # Forget written matches, stored ones are found in matches_detail
+                matches_pending: list = await asyncio.to_thread(journal.matches_pending)
+                seen_matches_id.intersection_update(matches_pending)
+                # Failed fetches stay pending and seen, retry them with the next ladder
+                retried: int = await queue_pending_matches(
+                    set(fetch_pipeline.take_failed()).intersection(matches_pending), fetch_pipeline)
+                if retried:
+                    logging.info(f'Retrying ** {retried} ** failed matches.')
+                logging.info(
+                    f'{SERVER}_{LEAGUE}: polling ** {len(scheduler)} ** summoners, '
+                    f'** {fetch_pipeline.written} ** matches written. Requests: {executor}')
+
+            due: list = scheduler.pop_due()
+            if due:
+                cursors: dict = await asyncio.to_thread(
+                    load_cursors_db, cursors_collection, due, matches_detail_collection)
+                # No games count, the scheduler decides who is polled
+                queued: list = await map_bounded(lambda puuid: getTFTRecentMatches(puuid, fetch_pipeline, seen_matches_id,
+                                                                                  cursor=cursors.get(puuid, {})),
+                                                 due, workers=summoner_workers)
+                for puuid, new_games in zip(due, queued):
+                    scheduler.done(puuid, new_games=new_games or 0)
+
+            wait: float = ladder_due - time.monotonic()
+            if scheduler.next_due() is not None:
+                wait = min(wait, scheduler.next_due())
+            await asyncio.sleep(max(0, wait))
+
     # *** Start *** #
     logging.info(
         f'*** Starting SERVER: {SERVER}, LEAGUE: {LEAGUE}, MAX_COUNT: ** {MAX_COUNT} ** run. ***')
 
     summoners_collection = db[f'{SERVER}_{LEAGUE}_summoners']
-    if LOAD_NEW:
+    cursors_collection = db[f'{SERVER}_matches_cursor']
+    matches_detail_collection = db[SERVER + '_' + 'matches_detail']
+    journal = ScrapeJournal(db[f'{SERVER}_{LEAGUE}_journal'])
+    resuming: bool = journal.begin(resume=resume)
+    if LOAD_NEW and not (resuming and journal.league_loaded()):
         summoners_df: DataFrame = await get_league(league=LEAGUE)
         summoners_df: DataFrame = summoners_df.rename(columns={'id': '_id'})
-        summoners_collection.drop()
-        summoners_collection.insert_many(
-            summoners_df.to_dict('records'), ordered=False)
+        # Upsert in place and prune summoners who left the league
+        upsert_collection_db(
+            summoners_df.to_dict('records'), collection=summoners_collection, prune=True)
+        journal.set_league_loaded()
     else:  # Read cached matches id
-        summoners_df = pd.DataFrame(list(summoners_collection.find()))
+        summoners_df = load_frame_db(summoners_collection)
 
     logging.info(
         f'Loading for ** {len(summoners_df.index)} ** {"new" if LOAD_NEW else "cached"} summoners.')
 
-    # Get all unique matches_id from assets dir
-    matches_asset: list = load_matches_db(collection=db[SERVER + '_' + 'matches_detail'], select={'metadata.match_id': 1})
-
-    matches_id: list = [match['metadata']['match_id']
-                        for match in matches_asset]
-    seen: set = set()
-    uniq_matches_id: list = [
-        x for x in matches_id if x not in seen and not seen.add(x)]
-    del matches_asset
-    logging.info(f'Loaded ** {len(uniq_matches_id)} ** matches.')
-
-    # For each summoners, get MAX_COUNT recent matches. Extend if any new.
-    new_counter = 0
-    for _, summoner in summoners_df.iterrows():
-        matches_detail, uniq_matches_id = await getTFTRecentMatches(summoner['puuid'], uniq_matches_id=uniq_matches_id)
-        if matches_detail:
-            new_counter += len(matches_detail)
-
-            # db unique id
-            for match in matches_detail:
-                match['_id'] = match['metadata']['match_id']
-
-            insert_collection_db(
-                matches_detail, collection=db[SERVER + '_' + 'matches_detail'])
-
-    client.close()
+    # Match ids claimed during this run. Stored ones are checked against
+    # matches_detail per matchlist instead of being preloaded.
+    seen_matches_id: set = set()
+
+    puuids: list = summoners_df['puuid'].tolist() if 'puuid' in summoners_df else []
+    if resuming:
+        summoners_done: set = journal.summoners_done()
+        puuids = [puuid for puuid in puuids if puuid not in summoners_done]
+        logging.info(
+            f'Resuming with ** {len(puuids)} ** summoners left.')
+
+    # Scrape cursors: newest stored game and ranked games count per puuid
+    cursors: dict = {}
+    games: dict = {}
+    if incremental:
+        cursors = load_cursors_db(cursors_collection, puuids,
+                                  matches_collection=matches_detail_collection)
+        # Wins + losses from a fresh ladder, one request in refresh mode
+        entries: list = summoners_df.to_dict('records') if LOAD_NEW else (
+            (await getTFTLeague(LEAGUE)) or {}).get('entries', [])
+        games_by_id: dict = {entry['summonerId']: entry['wins'] + entry['losses']
+                             for entry in entries}
+        if 'puuid' in summoners_df:
+            games = {summoner['puuid']: games_by_id[summoner['_id']]
+                     for summoner in summoners_df[['_id', 'puuid']].to_dict('records')
+                     if summoner['_id'] in games_by_id}
+
+    # For each summoners, get MAX_COUNT recent matches. Stream new ones into db.
+    # Summoners are fanned out concurrently, paced by the shared rate_limiter.
+    fetch_pipeline = FetchPipeline(
+        fetch=getTFTMatch, write=writeMatches, workers=fetch_workers, batch_size=batch_size,
+        flush_interval=poll_min_interval if daemon else None).start()
+    # Matches left pending by an interrupted or failed fetch come first
+    matches_pending: list = journal.matches_pending()
+    seen_matches_id.update(matches_pending)
+    queued_pending: int = await queue_pending_matches(matches_pending, fetch_pipeline)
+    logging.info(f'Fetching ** {queued_pending} ** pending matches.')
+    if daemon:
+        await poll_league(puuids, games, fetch_pipeline, seen_matches_id)
+    queued: list = await map_bounded(lambda puuid: getTFTRecentMatches(puuid, fetch_pipeline, seen_matches_id,
+                                                                      cursor=cursors.get(puuid, {}), games=games.get(puuid)),
+                                     puuids, workers=summoner_workers)
+    new_counter = await fetch_pipeline.join()
+    if fetch_pipeline.failed:
+        logging.warning(f'Failed to fetch ** {fetch_pipeline.failed} ** matches.')
+    logging.info(
+        f'Skipped ** {queued.count(None)} ** summoners without new games.')
+    journal.end()
 
     return [f'new_counter: ** {new_counter} ** new matches done.\n',
             f'Number of summoners: ** {len(summoners_df.index)} **.\n'
@@ -219,7 +417,8 @@ async def start_tft_fetch(load_new: bool, server: str, league: str, max_count: i
 
 # Main #
 async def main(config: ConfigParser) -> None:
-    """Get matches from RIOT API server. Fetching from different regions asynchronously. **Do not run from same region asynchronous.
+    """Get matches from RIOT API server. Fetching from different regions asynchronously.
+    Servers sharing a platform or routing cluster (e.g. na1 and oc1) draw from the same `rate_limiter` budget.
 
     Args:
         config (ConfigParser): Config parameters
@@ -228,11 +427,28 @@ async def main(config: ConfigParser) -> None:
     load_new: bool = config["load_new"]
     league: str = config["league"]
     max_count: int = config["max_count"]
+    fetch_workers: int = config["fetch_workers"]
+    batch_size: int = config["batch_size"]
+    summoner_workers: int = config["summoner_workers"]
+    incremental: bool = config["incremental"]
+    resume: bool = config["resume"]
+    daemon: bool = config["daemon"]
+    # Several leagues share the process, its clients and rate limits
+    leagues: List[str] = config["leagues"] or [league]
+    daemon_options: dict = {
+        'league_interval': config["league_interval"],
+        'poll_min_interval': config["poll_min_interval"],
+        'poll_max_interval': config["poll_max_interval"],
+    }
     tasks = [asyncio.create_task(start_tft_fetch(
-        load_new=load_new, server=server, league=league, max_count=max_count)) for server in servers]
-
-    # Run tasks asynchronously with timeout in 3000s
-    done, pending = await asyncio.wait(tasks, timeout=4600, return_when=asyncio.ALL_COMPLETED)
+        load_new=load_new, server=server, league=league, max_count=max_count,
+        fetch_workers=fetch_workers, batch_size=batch_size,
+        summoner_workers=summoner_workers, incremental=incremental, resume=resume,
+        daemon=daemon, **daemon_options)) for server in servers for league in leagues]
+
+    # Run tasks asynchronously with timeout in 3000s, a daemon runs until stopped
+    done, pending = await asyncio.wait(tasks, timeout=None if daemon else 4600,
+                                       return_when=asyncio.ALL_COMPLETED)
     logging.info(f'Done task count: {len(done)}')
     logging.info(f'Pending task count: {len(pending)}')
 
@@ -244,6 +460,11 @@ async def main(config: ConfigParser) -> None:
                           exc_info=done_task.exception())
     for pending_task in pending:
         pending_task.print_stack()
+    logging.info(f'Requests: {executor}')
+    await close_clients()
+    close_mongo_clients()
+    if pending:
+        logging.warning('Run again with --resume to continue the unfinished servers.')
     # await asyncio.create_task(start_tft_fetch(config))
 
 
@@ -262,6 +483,12 @@ if __name__ == '__main__':
                    target='league'),
         CustomArgs(['-m', '--max_count'], type=int,
                    target='max_count'),
+        CustomArgs(['-i', '--incremental'], type=bool,
+                   target='incremental'),
+        CustomArgs(['-r', '--resume'], type=bool,
+                   target='resume'),
+        CustomArgs(['-d', '--daemon'], type=bool,
+                   target='daemon'),
     ]
     config = ConfigParser.from_args(args, options)
 
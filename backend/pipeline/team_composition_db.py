@@ -4,11 +4,14 @@
 import io
 import os.path
 
-from typing import Collection, List
+from typing import Collection
 from datetime import date, datetime, timedelta
 import argparse
 import asyncio
 import collections
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
 
 # from PIL import Image
 import numpy as np
@@ -17,19 +20,18 @@ import pandas as pd
 from pandas import DataFrame, Series
 from pandas.plotting import table
 
-from pymongo import MongoClient
 from bson.binary import Binary
 
 # from pymongo.binary import Binary
 
-from kmodes.kmodes import KModes
-
-from sklearn.cluster import MiniBatchKMeans, DBSCAN
-from sklearn.pipeline import make_pipeline
-from sklearn.preprocessing import Normalizer
-
 # from thefuzz import fuzz
 
+from tft.clustering import get_cluster_engine, unit_matrix
+from tft.composition import composition_bits, composition_labels, group_compositions
+from tft.frames import impute, load_frame_db
+from tft.ranking import rank_placements, unit_items_ranking
+from tft.schema import apply_schema
+from tft.stages import Stage, run_stages
 from utils.parse_config import ConfigParser
 
 # from tft.api import *
@@ -56,14 +58,6 @@ for champion in tft8_set:
         CHAMPIONS_DICT[champion["apiName"]].append(trait)
 
 
-def impute(df) -> DataFrame:
-    for name in df.select_dtypes("number"):
-        df[name] = df[name].fillna(0)
-    for name in df.select_dtypes("object"):
-        df[name] = df[name].fillna("None")
-    return df
-
-
 def get_unit_items_ranking(df: DataFrame, unit: str):
     """Rank top items per champion
 
@@ -74,51 +68,13 @@ def get_unit_items_ranking(df: DataFrame, unit: str):
     Returns:
         DataFrame: ranked items per champion
     """
-    # filter and melt the dataframe
-    df = df.filter(regex=f"placement|{unit}_item0|{unit}_item1|{unit}_item2")
-    df[f"unit"] = f"{unit}"  # fill in current unit
-    # join 3 items to 1 column
-    # Only add items column if items exist
-    items_col = [f"{unit}_item0", f"{unit}_item1", f"{unit}_item2"]
-    available_items_col = [col for col in items_col if col in df.columns]
-    df[f"{unit}_items"] = df[available_items_col].apply(
-        lambda row: ", ".join(row.values.astype(str)), axis=1
-    )
-    # sort items for unique combination
-    df[f"{unit}_items"] = df[f"{unit}_items"].apply(
-        lambda x: ", ".join(sorted(x.split(", ")))
-    )
-    df = df.filter(regex=f"placement|{unit}_items|unit")
-    m = df.melt(
-        ["placement", f"unit"], value_name=f"{unit}_items_grp"
-    )  # , value_vars=[f'{unit}_items', f'{unit}']
-    # group and aggregate mean/median average_placement
-    dct = {
-        "value_count": (f"{unit}_items_grp", "count"),
-        "average_placement": ("placement", lambda x: round(x.mean(), 2)),
-    }
-    return (
-        m.groupby([f"unit", f"{unit}_items_grp"], as_index=False)
-        .agg(**dct)
-        .sort_values(by="average_placement")
-    )
+    return unit_items_ranking(df, [unit]).rename(columns={"items": f"{unit}_items_grp"})
 
 
 def get_augment_ranking(df: DataFrame, augment: str):
-    # filter and melt the dataframe
-    m = df.filter(regex=r"placement|" + augment).melt(
-        "placement", value_name=f"{augment}_grp"
-    )
-    # group and aggregate mean/median
-    dct = {
-        "Value_Count": (f"{augment}_grp", "count"),
-        "average_placement": ("placement", lambda x: round(x.mean(), 2)),
-    }
-    return (
-        m.groupby(f"{augment}_grp", as_index=False)
-        .agg(**dct)
-        .sort_values(by="average_placement")
-    )
+    # placement stats per augment
+    m = df[["placement", augment]].rename(columns={augment: f"{augment}_grp"})
+    return rank_placements(m, f"{augment}_grp", count_name="Value_Count")
 
 
 def add_traits(units_str):
@@ -139,30 +95,34 @@ def add_traits(units_str):
     return ",".join(comp_array)
 
 
-def get_unit_comp_ranking(df: DataFrame, units_col, add_trait=True):
-    # filter and melt the dataframe
-    df = df.filter(["placement"] + units_col)
-    # join units lvl > 0 to 1 column
-    df["comp"] = df[units_col].apply(
-        lambda row: ", ".join(row[row > 0].index.values.astype(str)), axis=1
-    )
-    if add_trait:
-        df["comp"] = df["comp"].apply(add_traits)
+def get_comp_labels(bits, units_col, add_trait=True):
+    """Text of packed compositions
 
+    Args:
+        bits (ndarray): packed compositions over units_col
+        units_col (list): units level columns
+        add_trait (bool, optional): traits-unit,traits-unit instead of unit, unit. Defaults to True.
+
+    Returns:
+        list: comp per composition
+    """
+    if add_trait:
+        labels, sep = [add_traits(unit) for unit in units_col], ","
+    else:
+        labels, sep = units_col, ", "
     # remove prefix .split('_',1).str[-1]
-    df["comp"] = df["comp"].str.replace("TFT8_", "")
-    df = df.filter(["placement", "comp"])
-    m = df.melt(["placement"], value_name=f"comp_grp")
-    # group and aggregate mean/median average_placement
-    dct = {
-        "value_count": (f"comp_grp", "count"),
-        "average_placement": ("placement", lambda x: round(x.mean(), 2)),
-    }
-    return (
-        m.groupby([f"comp_grp"], as_index=False)
-        .agg(**dct)
-        .sort_values(by="average_placement")
-    )
+    labels = [label.replace("TFT8_", "") for label in labels]
+    return composition_labels(bits, labels, sep)
+
+
+def get_unit_comp_ranking(df: DataFrame, units_col, add_trait=True, min_count=0):
+    # units lvl > 0 as bits, one group per comp
+    comps, codes = group_compositions(composition_bits(df[units_col].to_numpy()))
+    m = DataFrame({"placement": df["placement"].to_numpy(), "comp_grp": codes})
+    ranking = rank_placements(m, "comp_grp", min_count=min_count)
+    # labels of the ranked comps only
+    ranking["comp_grp"] = get_comp_labels(comps[ranking["comp_grp"].to_numpy()], units_col, add_trait)
+    return ranking.sort_values(by=["average_placement", "comp_grp"])
 
 
 def remove_traits(units_str):
@@ -193,15 +153,10 @@ def get_unit_composition(df: DataFrame, units_col, traits_col):
 def get_unit_composition_ranking(df: DataFrame, units_col, add_trait=True):
     # filter and melt the dataframe
     df = df.filter(["placement", "group"] + units_col)
-    # join units lvl > 0 to 1 column
-    df["comp"] = df[units_col].apply(
-        lambda row: ", ".join(row[row > 0].index.values.astype(str)), axis=1
-    )
-
-    if add_trait:
-        df["comp"] = df["comp"].apply(add_traits)
-
-    df["comp"] = df["comp"].str.replace("TFT8_", "")
+    # units lvl > 0 as bits, labelled once per comp
+    comps, codes = group_compositions(composition_bits(df[units_col].to_numpy()))
+    labels = get_comp_labels(comps, units_col, add_trait)
+    df["comp"] = pd.Categorical.from_codes(codes, categories=labels).reorder_categories(sorted(labels))
     df = df.filter(["placement", "group", "comp"])
     return df.sort_values(by="group")
 
@@ -259,77 +214,78 @@ def save_dataframe(
         buf.close()
 
 
-def cluster_composition_ranking(model, input_df, units_col):
-    """ """
+def cluster_composition_ranking(model, input_df, units_col, binary=False):
+    """Rank the comps of the clusters of model
+
+    Args:
+        model: clustering model with fit_predict
+        input_df (DataFrame): placement, units and traits levels
+        units_col (list): units level columns
+        binary (bool, optional): cluster the sparse binary units matrix instead of the levels. Defaults to False.
+
+    Returns:
+        DataFrame: placement, group, comp and group stats of each board
+    """
     logging.info(f"Plotting cluster_composition_ranking, shape: {input_df.shape}")
     if input_df.shape[-1] < 2:
         return
     df = input_df.copy()
     X = df.copy()
     X.pop(TARGETNAME)
-    clusters = model.fit_predict(X)
+    clusters = model.fit_predict(unit_matrix(X[units_col]) if binary else X)
 
     df.insert(0, "group", clusters, True)
 
     df = get_unit_composition_ranking(df, units_col, add_trait=False)
 
-    df["grp_count"] = df.groupby(["group"], as_index=False)["group"].transform("count")
-    df["grp_placement"] = (
-        df.groupby(["group"], as_index=False)["placement"].transform("mean").round(2)["placement"]
-    )
-    df["mode"] = df.groupby("group")["comp"].transform(lambda x: pd.Series.mode(x)[0])
+    stats = rank_placements(df, "group", count_name="grp_count").set_index("group")
+    df["grp_count"] = df["group"].map(stats["grp_count"])
+    df["grp_placement"] = df["group"].map(stats["average_placement"])
+    df["grp_ci_low"] = df["group"].map(stats["ci_low"])
+    df["grp_ci_high"] = df["group"].map(stats["ci_high"])
+    df["grp_top4_rate"] = df["group"].map(stats["top4_rate"])
+    # most frequent comp of each group, first one of a tie like Series.mode
+    modes = df.groupby(["group", "comp"], observed=True).size().groupby(level=0).idxmax()
+    df["mode"] = df["group"].map(modes.str[1])
     return df
 
 
-async def start_tft_data_analysis(
-    server: str,
-    league: str,
-    latest_release: str,
-    ranked_id: int,
-    patch: str,
-    save_csv: bool,
-    save_png: bool,
-):
-    # Start
-    SERVER: str = server
-    LEAGUE: str = league
-    LATEST_RELEASE: str = latest_release
-    RANKED_ID: int = ranked_id  # 1090 normal game 1100 ranked game
-    PATCH: date = date.fromisoformat(patch)
-    THREEDAY: datetime = (datetime.now() - timedelta(days=3)).strftime("%Y-%m-%d")
-    # # Data Loading
+def get_level_columns(df: DataFrame):
+    """Traits and units level columns
 
-    prefix: str = f"{SERVER}_{LEAGUE}_{LATEST_RELEASE}_{PATCH}"
-    logging.info(f"# Starting {prefix} loading.")
+    Args:
+        df (DataFrame): matches df
 
-    # Create Mongodb client using env uri
-    client = MongoClient(settings.db_uri)
-    db = client[settings.db_name]
+    Returns:
+        tuple: traits level columns, units level columns
+    """
+    numeric_cols: list = df.select_dtypes(include=np.number).columns.tolist()
+    return [s for s in numeric_cols if "Set8" in s], [s for s in numeric_cols if "TFT8" in s]
 
-    # # Load unique matches id
-    # Get all unique matches_id from assets dir
-    raw_collection = db[f"{prefix}_matches"]
-    binary_collection = db[f"{prefix}_binary"]
-    raw_df = pd.DataFrame(list(raw_collection.find()))
 
+def get_matches(raw_df: DataFrame) -> DataFrame:
+    """Matches df of the analysis: imputed levels and items, with counts and sums
+
+    Args:
+        raw_df (DataFrame): `{prefix}_matches` collection rows
+
+    Returns:
+        DataFrame: matches df
+    """
     # # Preprocessing
-    raw_df: DataFrame = impute(raw_df)
+    raw_df: DataFrame = apply_schema(impute(raw_df))
     logging.info(f"Loaded DataFrame shape: {raw_df.shape}")
     logging.info(f"Loaded DataFrame columns: {raw_df.columns}")
 
     X: DataFrame = raw_df.drop(["match_id", "_id"], axis=1)
     y: Series = X.pop(TARGETNAME)
-    X.fillna("", inplace=True)
 
-    numeric_cols: list = X.select_dtypes(include=np.number).columns.tolist()
     categorical_cols: list = X.select_dtypes(
         include=["object", "category"]
     ).columns.tolist()
 
-    # traits level columns
-    traits_col: list = [s for s in numeric_cols if "Set8" in s]
-    # units level columns
-    units_col: list = [s for s in numeric_cols if "TFT8" in s]
+    # traits and units level columns
+    traits_col, units_col = get_level_columns(X)
     # augments columns
     augments_col: list[str] = ["augment0", "augment1", "augment2"]
     # units items columns
@@ -338,199 +294,170 @@ async def start_tft_data_analysis(
     X[f"items_count"] = X[items_col].apply(
         lambda row: sum(x != "None" for x in row), axis=1
     )
-    X[f"traits_sum"] = X[traits_col].sum(axis=1)
-    X[f"units_sum"] = X[units_col].sum(axis=1)
-
-    numeric_cols = X.select_dtypes(include=np.number).columns.tolist()
-    categorical_cols = X.select_dtypes(include=["object", "category"]).columns.tolist()
+    X[f"traits_sum"] = X[traits_col].sum(axis=1).astype(np.int64)
+    X[f"units_sum"] = X[units_col].sum(axis=1).astype(np.int64)
 
-    X[numeric_cols] = X[numeric_cols].applymap(np.int64)
+    # Integer levels, kept in uint8
+    X = apply_schema(X, truncate_levels=True)
 
     # Matches DataFrame #
     matches_df = X.copy()
     matches_df[TARGETNAME] = y
+    return matches_df
 
-    # # Augments Ranking
 
-    # ## Stage 2-1 augment ranking
-    augment0_rank_df = get_augment_ranking(matches_df, "augment0")
+def select_augment(matches_df: DataFrame, augment: str) -> DataFrame:
+    # columns of get_augment_ranking
+    return matches_df[[TARGETNAME, augment]]
 
-    # Output
-    save_dataframe(
-        augment0_rank_df,
-        f"{prefix}_augment0_ranking",
-        collection=binary_collection,
-        description="Augment stage 2-1",
-        save_png=save_png,
-    )
-    if save_csv:
-        augment0_rank_df.to_csv(
-            os.path.join(ASSETS_DIR, f"{prefix}_augment0_ranking.csv"), index=False
-        )
 
-    # ## Stage 3-2 augment ranking
-    augment1_rank_df = get_augment_ranking(matches_df, "augment1")
+def select_items(matches_df: DataFrame) -> DataFrame:
+    # columns of get_top5_items_ranking: units levels and their items
+    _, units_col = get_level_columns(matches_df)
+    items_col = [s for s in matches_df.columns if s.split("_item")[0] in units_col]
+    return matches_df[[TARGETNAME] + units_col + items_col]
 
-    # Output
-    save_dataframe(
-        augment1_rank_df,
-        f"{prefix}_augment1_ranking",
-        collection=binary_collection,
-        description="Augment stage 3-2",
-        save_png=save_png,
-    )
-    if save_csv:
-        augment1_rank_df.to_csv(
-            os.path.join(ASSETS_DIR, f"{prefix}_augment1_ranking.csv"), index=False
-        )
 
-    # ## Stage 4-2 augment ranking
-    augment2_rank_df = get_augment_ranking(matches_df, "augment2")
+def select_levels(matches_df: DataFrame) -> DataFrame:
+    # columns of get_units_comp
+    traits_col, units_col = get_level_columns(matches_df)
+    return matches_df[[TARGETNAME] + units_col + traits_col]
 
-    # Output
-    save_dataframe(
-        augment2_rank_df,
-        f"{prefix}_augment2_ranking",
-        collection=binary_collection,
-        description="Augment stage 4-2",
-        save_png=save_png,
-    )
-    if save_csv:
-        augment2_rank_df.to_csv(
-            os.path.join(ASSETS_DIR, f"{prefix}_augment2_ranking.csv"), index=False
-        )
 
-    # # Items Ranking
+def get_top5_items_ranking(matches_df: DataFrame) -> DataFrame:
+    # Get top5 value_count >= 12, every unit ranked at once
+    _, units_col = get_level_columns(matches_df)
+    return (
+        unit_items_ranking(matches_df, units_col, min_count=12)
+        .groupby("unit", sort=False)
+        .head(5)
+        .reset_index(drop=True)
+    )
 
-    # Get top5 value_count >= 12
-    top5_items_list = []
-    for unit in units_col:
-        df = get_unit_items_ranking(df=matches_df, unit=unit)
-        df = df[df["value_count"] >= 12][:5]  # Top 5 with counts >= 12
-        top5_items_list.extend(df.values)
 
-    top5_items_list = pd.DataFrame(
-        top5_items_list, columns=["unit", "items", "value_count", "average_placement"]
-    )
+def get_units_comp(matches_df: DataFrame) -> DataFrame:
+    # # Team composition Clustering
+    traits_col, units_col = get_level_columns(matches_df)
+    return get_unit_composition(matches_df, units_col, traits_col)
 
-    # Output
-    save_dataframe(
-        top5_items_list,
-        f"{prefix}_top5_items",
-        collection=binary_collection,
-        description="Top 5 items per champion",
-        save_png=save_png,
-    )
-    if save_csv:
-        top5_items_list.to_csv(
-            os.path.join(ASSETS_DIR, f"{prefix}_top5_items.csv"), index=False
-        )
 
-    # ## Top 1 items
-    # top5_items_list.groupby('unit').head(1)
+def get_cluster_comp_ranking(units_comp_df: DataFrame, engine: str, params: dict = {}) -> DataFrame:
+    _, units_col = get_level_columns(units_comp_df)
+    model, binary = get_cluster_engine(engine, **params)
+    return cluster_composition_ranking(model, units_comp_df, units_col, binary)
 
-    # # Team Composition Ranking
 
-    # Get top5
-    # comp_df = get_unit_comp_ranking(matches_df, units_col)
+def get_top_comp_ranking(ranking_df: DataFrame, limit: int = None) -> DataFrame:
+    # best comp of each group
+    return ranking_df.groupby(["group"]).head(1).sort_values(by="grp_placement")[:limit]
 
-    # top5_comp_list = []
-    # m = comp_df[comp_df['value_count'] >= 1]  # [:5] #Top 5 with counts >= 12
-    # top5_comp_list.extend(m.values)
-    # comp_ranking_df = pd.DataFrame(top5_comp_list, columns=[
-    #     'comp', 'value_count', 'average_placement'])
 
-    # comp_ranking_df  # .groupby('comp').head(1)
+# Comp rankings `{prefix}_{name}_comp_ranking`: tft.clustering engine, its params and
+# top, the count of groups plotted (all when missing)
+CLUSTER_MODELS: dict = {
+    "kmode": {"engine": "kmodes"},
+    "kmeans": {"engine": "kmeans"},
+    "dbscan": {"engine": "dbscan", "top": 36},
+}
 
-    # composition_ranking_df = comp_ranking_df.copy()
 
-    # # Team composition Clustering
-    units_comp_df: DataFrame = get_unit_composition(matches_df, units_col, traits_col)
+def get_analysis_stages(cluster_models: dict = CLUSTER_MODELS) -> list[Stage]:
+    """Analysis DAG, stage functions run on a process pool
 
-    # ## KMode
-    # using integers
+    The stages using matches get only the columns they read, instead of a
+    pickled copy of the whole df each.
 
-    # Building the model with 3 clusters
-    kmode = KModes(n_clusters=30, init="random", n_init=5, verbose=0)
+    Args:
+        cluster_models (dict, optional): comp rankings. Defaults to CLUSTER_MODELS.
 
-    # top5_comp_ranking_list = []
-    # # [:5] #Top 5 with counts >= 12
-    # m = kmode_ranking_df[kmode_ranking_df['grp_count'] >= 10]
-    # top5_comp_ranking_list.extend(m.values)
-    # top_kmode_ranking_df = pd.DataFrame(top5_comp_ranking_list, columns=[
-    #                                     'placement', 'group', 'comp', 'grp_count', 'grp_placement'])
+    Returns:
+        list[Stage]: stages, named like their output
+    """
+    stages = [
+        Stage("matches", get_matches, ("raw",)),
+        *[
+            Stage(f"{augment}_ranking", get_augment_ranking, ("matches",), {"augment": augment},
+                  {"matches": partial(select_augment, augment=augment)})
+            for augment in ["augment0", "augment1", "augment2"]
+        ],
+        Stage("top5_items", get_top5_items_ranking, ("matches",), select={"matches": select_items}),
+        Stage("units_comp", get_units_comp, ("matches",), select={"matches": select_levels}),
+    ]
+    for name, options in cluster_models.items():
+        params = {key: value for key, value in options.items() if key not in ["engine", "top"]}
+        stages.append(
+            Stage(f"{name}_comp_ranking", get_cluster_comp_ranking, ("units_comp",),
+                  {"engine": options["engine"], "params": params})
+        )
+    return stages
 
-    kmode_ranking_df = cluster_composition_ranking(kmode, units_comp_df, units_col)
-    kmode_df = (
-        kmode_ranking_df.groupby(["group"]).head(1).sort_values(by="grp_placement")
-    )
 
-    # Output
-    save_dataframe(
-        kmode_df,
-        f"{prefix}_kmode_comp_ranking",
-        collection=binary_collection,
-        description="KMODE Top team composition",
-        save_png=save_png,
-    )
-    if save_csv:
-        kmode_ranking_df.to_csv(
-            os.path.join(ASSETS_DIR, f"{prefix}_kmode_comp_ranking.csv"), index=False
+def get_analysis_outputs(cluster_models: dict = CLUSTER_MODELS) -> dict:
+    """Saved stages, description and top rows to plot"""
+    outputs = {
+        "augment0_ranking": ("Augment stage 2-1", None),
+        "augment1_ranking": ("Augment stage 3-2", None),
+        "augment2_ranking": ("Augment stage 4-2", None),
+        "top5_items": ("Top 5 items per champion", None),
+    }
+    for name, options in cluster_models.items():
+        outputs[f"{name}_comp_ranking"] = (
+            f"{name.upper()} Top team composition",
+            partial(get_top_comp_ranking, limit=options.get("top")),
         )
+    return outputs
 
-    # ## KMeans
-    # normalization to improve the k-means result.
-    normalizer = Normalizer(copy=False)
-    # Building the model with 30 clusters
-    kms = MiniBatchKMeans(n_clusters=30, init="k-means++", n_init=10, verbose=0)
-    kmeans = make_pipeline(normalizer, kms)
 
-    kmeans_ranking_df = cluster_composition_ranking(kmeans, units_comp_df, units_col)
-    kmeans_df = (
-        kmeans_ranking_df.groupby(["group"]).head(1).sort_values(by="grp_placement")
-    )
+async def start_tft_data_analysis(
+    server: str,
+    league: str,
+    latest_release: str,
+    ranked_id: int,
+    patch: str,
+    save_csv: bool,
+    save_png: bool,
+    executor: Executor = None,
+    cluster_models: dict = CLUSTER_MODELS,
+):
+    """Rank augments, items and team compositions of a server league, stages run on executor"""
+    # Start
+    SERVER: str = server
+    LEAGUE: str = league
+    LATEST_RELEASE: str = latest_release
+    RANKED_ID: int = ranked_id  # 1090 normal game 1100 ranked game
+    PATCH: date = date.fromisoformat(patch)
+    THREEDAY: datetime = (datetime.now() - timedelta(days=3)).strftime("%Y-%m-%d")
+    # # Data Loading
 
-    # Output
-    save_dataframe(
-        kmeans_df,
-        f"{prefix}_kmeans_comp_ranking",
-        collection=binary_collection,
-        description="KMEANS Top team composition",
-        save_png=save_png,
-    )
-    if save_csv:
-        kmeans_ranking_df.to_csv(
-            os.path.join(ASSETS_DIR, f"{prefix}_kmeans_comp_ranking.csv"), index=False
-        )
+    prefix: str = f"{SERVER}_{LEAGUE}_{LATEST_RELEASE}_{PATCH}"
+    logging.info(f"# Starting {prefix} loading.")
 
-    # ## DBSCAN
-    # Building the model with X clusters
-    # normalization to improve the k-means result.
-    normalizer = Normalizer(copy=False)
-    dbs = DBSCAN(
-        eps=0.37, metric="euclidean", min_samples=3, n_jobs=-1
-    )  # eps=0.053, metric='cosine'
-    dbscan = make_pipeline(normalizer, dbs)
-    dbscan_ranking_df = cluster_composition_ranking(dbscan, units_comp_df, units_col)
-
-    dbscan_df = (
-        dbscan_ranking_df.groupby(["group"])
-        .head(1)
-        .sort_values(by="grp_placement", ascending=True)[:36]
-    )
+    # Mongodb client shared by the servers, using env uri
+    db = get_mongo_client(settings.db_uri)[settings.db_name]
+
+    # # Load unique matches id
+    # Get all unique matches_id from assets dir
+    raw_collection = db[f"{prefix}_matches"]
+    binary_collection = db[f"{prefix}_binary"]
+    raw_df = await asyncio.to_thread(load_frame_db, raw_collection)
+
+    # # Stages, independent ones run at the same time on the executor
+    results: dict = await run_stages(get_analysis_stages(cluster_models), executor, {"raw": raw_df})
 
     # Output
-    save_dataframe(
-        dbscan_df,
-        f"{prefix}_dbscan_comp_ranking",
-        collection=binary_collection,
-        description="DBSCAN Top team composition",
-        save_png=save_png,
-    )
-    if save_csv:
-        dbscan_ranking_df.to_csv(
-            os.path.join(ASSETS_DIR, f"{prefix}_dbscan_comp_ranking.csv"), index=False
+    for name, (description, top) in get_analysis_outputs(cluster_models).items():
+        ranking_df: DataFrame = results[name]
+        if ranking_df is None:
+            continue
+        save_dataframe(
+            top(ranking_df) if top else ranking_df,
+            f"{prefix}_{name}",
+            collection=binary_collection,
+            description=description,
+            save_png=save_png,
         )
+        if save_csv:
+            ranking_df.to_csv(os.path.join(ASSETS_DIR, f"{prefix}_{name}.csv"), index=False)
     # # End
     return [f"# End {prefix} done."]
 
@@ -544,25 +471,37 @@ async def main(config: ConfigParser) -> None:
     patch: str = config["patch"]
     save_csv: bool = config["save_csv"]
     save_png: bool = config["save_png"]
-
-    tasks = [
-        asyncio.create_task(
-            start_tft_data_analysis(
-                server=server,
-                league=league,
-                latest_release=latest_release,
-                ranked_id=ranked_id,
-                patch=patch,
-                save_csv=save_csv,
-                save_png=save_png,
+    # analysis stages processes shared by the servers, cpu count when None
+    analysis_workers: int = config.config.get("analysis_workers", None)
+    cluster_models: dict = config.config.get("cluster_models", CLUSTER_MODELS)
+
+    # Spawned, forking would copy the Mongo client and the threads of the loop
+    executor = ProcessPoolExecutor(max_workers=analysis_workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        tasks = [
+            asyncio.create_task(
+                start_tft_data_analysis(
+                    server=server,
+                    league=league,
+                    latest_release=latest_release,
+                    ranked_id=ranked_id,
+                    patch=patch,
+                    save_csv=save_csv,
+                    save_png=save_png,
+                    executor=executor,
+                    cluster_models=cluster_models,
+                )
             )
-        )
-        for server in servers
-    ]
+            for server in servers
+        ]
 
-    done, pending = await asyncio.wait(
-        tasks, timeout=1800, return_when=asyncio.ALL_COMPLETED
-    )
+        done, pending = await asyncio.wait(
+            tasks, timeout=1800, return_when=asyncio.ALL_COMPLETED
+        )
+    finally:
+        # Waits for the running stages without blocking the loop
+        await asyncio.to_thread(executor.shutdown)
+        close_mongo_clients()
     logging.info(f"Done task count: {len(done)}")
     logging.info(f"Pending task count: {len(pending)}")
 
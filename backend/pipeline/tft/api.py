@@ -2,12 +2,14 @@ import asyncio
 import json
 import pandas as pd
 
-from pantheon import pantheon
-
 from utils.configuration import settings
 from utils.logger import logging
 from utils import utils
 
+from tft.client import get_client
+from tft.executor import RequestExecutor
+from tft.rate_limiter import RateLimiter
+
 API_KEY = settings.api_key
 ASSETS_DIR = settings.assets_dir
 SERVER = settings.server
@@ -19,13 +21,14 @@ def requestsLog(url, status, headers):
     logging.debug(headers)
 
 
-panth = pantheon.Pantheon(
+panth = get_client(
     SERVER, API_KEY, requests_logging_function=requestsLog, debug=True)
+executor = RequestExecutor(RateLimiter(app_limits=settings.app_rate_limits))
 
 
 async def getSummonerId(name):
     try:
-        data = await panth.get_tft_summoner_by_name(name)
+        data = await executor.call(SERVER, 'get_tft_summoner_by_name', panth.get_tft_summoner_by_name, name)
         return (data['id'], data['accountId'], data['puuid'])
     except Exception as e:
         logging.error(e)
@@ -33,7 +36,7 @@ async def getSummonerId(name):
 
 async def getTFTRecentMatchlist(puuid, count=MAX_COUNT):
     try:
-        data = await panth.get_tft_matchlist(puuid, count=count)
+        data = await executor.call(SERVER, 'get_tft_matchlist', panth.get_tft_matchlist, puuid, count=count)
         return data
     except Exception as e:
         logging.error(e)
@@ -46,7 +49,7 @@ async def getTFTRecentMatches(puuid, uniq_matches_id=[]):
         new_matchlist = set(matchlist) - set(uniq_matches_id)
         logging.info(f'Fetching ** {len(new_matchlist)} ** new matches')
 
-        tasks = [panth.get_tft_match(match)
+        tasks = [executor.call(SERVER, 'get_tft_match', panth.get_tft_match, match)
                  for match in new_matchlist]
         return await asyncio.gather(*tasks)
     except Exception as e:
@@ -55,7 +58,7 @@ async def getTFTRecentMatches(puuid, uniq_matches_id=[]):
 
 async def getTFTChallengerLeague():
     try:
-        data = await panth.get_tft_challenger_league()
+        data = await executor.call(SERVER, 'get_tft_challenger_league', panth.get_tft_challenger_league)
         return data
     except Exception as e:
         logging.error(e)
@@ -63,7 +66,7 @@ async def getTFTChallengerLeague():
 
 async def getTFTGrandmasterLeague():
     try:
-        data = await panth.get_tft_grandmaster_league()
+        data = await executor.call(SERVER, 'get_tft_grandmaster_league', panth.get_tft_grandmaster_league)
         return data
     except Exception as e:
         logging.error(e)
@@ -71,7 +74,7 @@ async def getTFTGrandmasterLeague():
 
 async def getTFTMasterLeague():
     try:
-        data = await panth.get_tft_master_league()
+        data = await executor.call(SERVER, 'get_tft_master_league', panth.get_tft_master_league)
         return data
     except Exception as e:
         logging.error(e)
@@ -79,7 +82,7 @@ async def getTFTMasterLeague():
 
 async def getTFT_Summoner(summonerId):
     try:
-        data = await panth.get_tft_summoner(summonerId)
+        data = await executor.call(SERVER, 'get_tft_summoner', panth.get_tft_summoner, summonerId)
         return data
     except Exception as e:
         logging.error(e)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# coding: utf-8
+import asyncio
+import json
+import logging
+from typing import Dict
+
+import aiohttp
+from pantheon import pantheon
+
+# Connection pool of the shared HTTP session, Riot serves one host per platform/region.
+POOL_LIMIT: int = 100
+POOL_LIMIT_PER_HOST: int = 30
+DNS_CACHE_TTL: int = 600  # seconds
+KEEPALIVE_TIMEOUT: int = 60  # seconds
+REQUEST_TIMEOUT: int = 30  # seconds
+
+_session: aiohttp.ClientSession = None
+_session_loop: asyncio.AbstractEventLoop = None
+_clients: Dict[str, 'TFTPantheon'] = {}
+
+
+def get_session() -> aiohttp.ClientSession:
+    """HTTP session shared by every client of the running event loop.
+
+    Reusing it keeps connections alive and shares the DNS cache and TLS
+    sessions, instead of pantheon's new session (and handshake) per request.
+    """
+    global _session, _session_loop
+    if _session is None or _session.closed or _session_loop is not asyncio.get_running_loop():
+        _session_loop = asyncio.get_running_loop()
+        connector = aiohttp.TCPConnector(limit=POOL_LIMIT, limit_per_host=POOL_LIMIT_PER_HOST,
+                                         ttl_dns_cache=DNS_CACHE_TTL, keepalive_timeout=KEEPALIVE_TIMEOUT,
+                                         ssl=pantheon.Pantheon.SSL_CONTEXT)
+        _session = aiohttp.ClientSession(connector=connector,
+                                         timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+    return _session
+
+
+def get_client(server: str, api_key: str, **kwargs) -> 'TFTPantheon':
+    """The process wide client of a server, created on first use.
+
+    Args:
+        server (str): Platform, e.g. 'na1', 'euw1', 'kr'.
+        api_key (str): Riot API key.
+        **kwargs: TFTPantheon options, only used when creating the client.
+    """
+    if server not in _clients:
+        _clients[server] = TFTPantheon(server, api_key, **kwargs)
+    return _clients[server]
+
+
+async def close_clients() -> None:
+    """Close the shared HTTP session, call once the event loop is done fetching."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+class TFTPantheon(pantheon.Pantheon):
+    """Pantheon with a pooled HTTP session and the TFT endpoint filters pantheon does not expose."""
+
+    async def fetch(self, url, method="GET", data=None):
+        """
+        Same as pantheon's fetch, over the shared session instead of a new one per request.
+        A failed request is logged and returns None, which the exceptions decorator raises as
+        exc.Timeout once the ratelimit decorator has given its token back.
+        """
+        headers = {
+            "X-Riot-Token": self._key
+        }
+
+        try:
+            if method == "GET":
+                response = await get_session().request("GET", url, headers=headers)
+            else:
+                response = await get_session().request(method, url, headers=headers, data=json.dumps(data))
+            # Read the body here, it also releases the connection to the pool
+            await response.text()
+        # Connection errors and timeouts, retried by RequestExecutor
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.error(f'{url}: {e!r}')
+            return None
+
+        # If a logging function is passed, send it url, status code and headers
+        if self._requests_logging_function:
+            self._requests_logging_function(url, response.status, response.headers)
+
+        return response
+
+    @pantheon.Pantheon.auto_retry
+    @pantheon.Pantheon.exceptions
+    @pantheon.Pantheon.ratelimit_region
+    async def get_tft_matchlist(self, puuId, count=20, startTime=None):
+        """
+        :param string puuId: puuId of the player
+        :param int count: number of games requested
+        :param int startTime: epoch seconds, only games played since then are returned
+
+        Returns the result of https://developer.riotgames.com/apis#tft-match-v1/GET_getMatchIdsByPUUID
+        """
+        url = (self.BASE_URL_TFT + "match/v1/matches/by-puuid/{puuId}/ids?count={count}").format(
+            server=self._region, puuId=puuId, count=count)
+        if startTime is not None:
+            url += f"&startTime={int(startTime)}"
+        return await self.fetch(url)
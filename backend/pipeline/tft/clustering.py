@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# coding: utf-8
+from typing import Any, Callable, Dict, Tuple
+
+import numpy as np
+from kmodes.kmodes import KModes
+from scipy import sparse
+from sklearn.cluster import DBSCAN, MiniBatchKMeans
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import Normalizer
+
+from .composition import composition_bits, group_compositions, jaccard_similarity, popcount
+
+RANDOM_STATE: int = 42
+# Rows of the units matrix packed at once
+PACK_BATCH_SIZE: int = 100000
+# Default share of the boards around a core comp of JaccardDBSCAN
+MIN_SAMPLES_RATE: float = 0.0002
+
+
+def unit_matrix(levels) -> sparse.csr_matrix:
+    """Sparse binary units matrix, a board has a unit when its level is > 0.
+
+    Args:
+        levels (DataFrame or ndarray): Units levels, one row per board and one column per unit.
+
+    Returns:
+        csr_matrix: bool matrix of the same shape.
+    """
+    return sparse.csr_matrix(np.asarray(levels) > 0)
+
+
+def unique_compositions(X) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Distinct compositions of a units matrix, the binary engines cluster them weighted by their count.
+
+    Args:
+        X (csr_matrix or ndarray): Units matrix, nonzero when a board has the unit.
+
+    Returns:
+        Tuple[ndarray, ndarray, ndarray]: Packed distinct compositions, index of each board in them,
+            boards count of each one.
+    """
+    X = sparse.csr_matrix(X)
+    bits = np.concatenate([composition_bits(X[start:start + PACK_BATCH_SIZE].toarray())
+                           for start in range(0, max(X.shape[0], 1), PACK_BATCH_SIZE)])[:X.shape[0]]
+    compositions, inverse = group_compositions(bits)
+    return compositions, inverse, np.bincount(inverse, minlength=len(compositions))
+
+
+def _unpack(bits: np.ndarray, n_units: int) -> np.ndarray:
+    return np.unpackbits(np.ascontiguousarray(bits).view(np.uint8), axis=1, bitorder='little')[:, :n_units]
+
+
+def _noise_small(labels: np.ndarray, weights: np.ndarray, min_size: int) -> np.ndarray:
+    """Clusters of less than min_size boards as noise (-1), the others numbered from 0."""
+    sizes = np.bincount(labels, weights=weights)
+    kept = sizes >= min_size
+    numbers = np.where(kept, np.cumsum(kept) - 1, -1)
+    return numbers[labels]
+
+
+def minhash_signatures(X, n_hashes: int, random_state: int = RANDOM_STATE) -> np.ndarray:
+    """MinHashes of the rows of a binary units matrix, their equal share estimates the Jaccard similarity.
+
+    Args:
+        X (csr_matrix or ndarray): Units matrix.
+        n_hashes (int): MinHashes per row, one permutation of the units each.
+        random_state (int, optional): Permutations seed. Defaults to RANDOM_STATE.
+
+    Returns:
+        ndarray: int32 array of shape (rows, n_hashes), n_units for an empty row.
+    """
+    X = sparse.csr_matrix(X)
+    rng = np.random.default_rng(random_state)
+    signatures = np.full((X.shape[0], n_hashes), X.shape[1], dtype=np.int32)
+    filled = np.flatnonzero(np.diff(X.indptr))
+    if len(filled):
+        for index in range(n_hashes):
+            permutation = rng.permutation(X.shape[1]).astype(np.int32)
+            signatures[filled, index] = np.minimum.reduceat(permutation[X.indices], X.indptr[filled])
+    return signatures
+
+
+def lsh_buckets(compositions: np.ndarray, n_units: int, bands: int, rows: int,
+                random_state: int = RANDOM_STATE) -> np.ndarray:
+    """Bucket of packed comps in each LSH band.
+
+    Comps sharing the `rows` MinHashes of a band share its bucket, likely
+    above a (1 / bands) ** (1 / rows) Jaccard similarity.
+
+    Returns:
+        ndarray: int64 array of shape (comps, bands), bucket ids unique across bands.
+    """
+    signatures = minhash_signatures(_unpack(compositions, n_units), bands * rows, random_state)
+    buckets = np.empty((len(compositions), bands), dtype=np.int64)
+    offset = 0
+    for band in range(bands):
+        _, bucket = np.unique(signatures[:, band * rows:(band + 1) * rows], axis=0, return_inverse=True)
+        buckets[:, band] = bucket.reshape(-1) + offset
+        offset += bucket.max() + 1 if len(bucket) else 0
+    return buckets
+
+
+class MinHashLSH:
+    """Boards bucketed by MinHash-LSH of their units.
+
+    A distinct comp joins the bucket holding the most boards among its
+    `bands` buckets, so a cluster is a bucket of alike comps and buckets are
+    not chained into one. Clusters of less than `min_size` boards are noise
+    (-1) like DBSCAN ones. Memory is linear in the distinct comps.
+    """
+
+    def __init__(self, bands: int = 4, rows: int = 3, min_size: int = 3, random_state: int = RANDOM_STATE):
+        self.bands = bands
+        self.rows = rows
+        self.min_size = min_size
+        self.random_state = random_state
+
+    def fit_predict(self, X) -> np.ndarray:
+        compositions, inverse, weights = unique_compositions(X)
+        buckets = lsh_buckets(compositions, X.shape[1], self.bands, self.rows, self.random_state)
+        sizes = np.bincount(buckets.ravel(), weights=np.repeat(weights, self.bands))
+        chosen = buckets[np.arange(len(buckets)), sizes[buckets].argmax(axis=1)]
+        _, labels = np.unique(chosen, return_inverse=True)
+        return _noise_small(labels.reshape(-1), weights, self.min_size)[inverse]
+
+
+class MiniBatchKModes:
+    """Streaming k-modes of binary units, Hamming distances as popcounts of packed comps.
+
+    Each mini-batch of distinct comps is assigned to its nearest mode, then
+    every mode becomes the majority of the units of the boards assigned to it
+    so far. Memory is the packed comps and a (n_clusters, units) count.
+    """
+
+    def __init__(self, n_clusters: int = 30, batch_size: int = 10000, max_iter: int = 10,
+                 random_state: int = RANDOM_STATE):
+        self.n_clusters = n_clusters
+        self.batch_size = batch_size
+        self.max_iter = max_iter
+        self.random_state = random_state
+
+    @staticmethod
+    def assign(bits: np.ndarray, modes: np.ndarray) -> np.ndarray:
+        """Nearest mode of each packed comp."""
+        return popcount(bits[:, None, :] ^ modes[None, :, :]).argmin(axis=1)
+
+    def fit_predict(self, X) -> np.ndarray:
+        n_units = X.shape[1]
+        compositions, inverse, weights = unique_compositions(X)
+        rng = np.random.default_rng(self.random_state)
+        n_clusters = min(self.n_clusters, len(compositions))
+        # Initial modes, distinct comps drawn by their frequency
+        modes = compositions[rng.choice(len(compositions), n_clusters, replace=False, p=weights / weights.sum())]
+        counts = np.zeros((n_clusters, n_units))
+        sizes = np.zeros(n_clusters)
+
+        for _ in range(self.max_iter):
+            previous = modes.copy()
+            order = rng.permutation(len(compositions))
+            for start in range(0, len(order), self.batch_size):
+                batch = order[start:start + self.batch_size]
+                labels = self.assign(compositions[batch], modes)
+                assigned = np.zeros((len(batch), n_clusters))
+                assigned[np.arange(len(batch)), labels] = weights[batch]
+                counts += assigned.T @ _unpack(compositions[batch], n_units)
+                sizes += assigned.sum(axis=0)
+                updated = sizes > 0
+                modes[updated] = composition_bits(counts[updated] * 2 > sizes[updated, None])
+            if np.array_equal(modes, previous):
+                break
+
+        labels = np.concatenate([self.assign(compositions[start:start + self.batch_size], modes)
+                                 for start in range(0, max(len(compositions), 1), self.batch_size)])
+        return labels[:len(compositions)][inverse]
+
+
+class JaccardDBSCAN:
+    """DBSCAN of the distinct comps over approximate Jaccard neighbors.
+
+    Candidate neighbors of a comp are the next `window` comps of each of its
+    LSH buckets, their exact Jaccard distance is a popcount of packed comps
+    and the ones within `eps` make a sparse neighbors graph. Identical boards
+    are one weighted sample, so memory is linear in the distinct comps
+    instead of quadratic in the boards. `min_samples` counts boards, by
+    default MIN_SAMPLES_RATE of them (at least 3) so that clusters do not
+    merge as the dataset grows.
+    """
+
+    def __init__(self, eps: float = 0.3, min_samples: int = None, bands: int = 8, rows: int = 3, window: int = 20,
+                 random_state: int = RANDOM_STATE):
+        self.eps = eps
+        self.min_samples = min_samples
+        self.bands = bands
+        self.rows = rows
+        self.window = window
+        self.random_state = random_state
+
+    def neighbors(self, compositions: np.ndarray, n_units: int) -> sparse.csr_matrix:
+        """Sparse Jaccard distances of the candidate neighbors within eps."""
+        buckets = lsh_buckets(compositions, n_units, self.bands, self.rows, self.random_state)
+        pairs = []
+        for band in range(self.bands):
+            order = np.argsort(buckets[:, band], kind='stable')
+            for step in range(1, min(self.window, len(order) - 1) + 1):
+                same = buckets[order[step:], band] == buckets[order[:-step], band]
+                pairs.append(np.stack([order[:-step][same], order[step:][same]]))
+        sources, targets = np.unique(np.concatenate(pairs, axis=1), axis=1) if pairs else np.zeros((2, 0), int)
+        distances = 1 - jaccard_similarity(compositions[sources], compositions[targets])
+        close = distances <= self.eps
+        # Distinct comps are never at 0, a stored 0 would still be a neighbor
+        n = len(compositions)
+        graph = sparse.coo_matrix((distances[close], (sources[close], targets[close])), shape=(n, n))
+        return (graph + graph.T).tocsr()
+
+    def fit_predict(self, X) -> np.ndarray:
+        compositions, inverse, weights = unique_compositions(X)
+        min_samples = self.min_samples or max(3, round(MIN_SAMPLES_RATE * X.shape[0]))
+        model = DBSCAN(eps=self.eps, min_samples=min_samples, metric='precomputed')
+        labels = model.fit_predict(self.neighbors(compositions, X.shape[1]), sample_weight=weights)
+        return labels[inverse]
+
+
+def kmodes_model(n_clusters: int = 30, init: str = 'random', n_init: int = 5) -> KModes:
+    # Building the model with 30 clusters
+    return KModes(n_clusters=n_clusters, init=init, n_init=n_init, verbose=0)
+
+
+def kmeans_model(n_clusters: int = 30, n_init: int = 10):
+    # normalization to improve the k-means result.
+    normalizer = Normalizer(copy=False)
+    kms = MiniBatchKMeans(n_clusters=n_clusters, init='k-means++', n_init=n_init, verbose=0)
+    return make_pipeline(normalizer, kms)
+
+
+def dbscan_model(eps: float = 0.37, min_samples: int = 3):
+    # normalization to improve the k-means result.
+    normalizer = Normalizer(copy=False)
+    dbs = DBSCAN(eps=eps, metric='euclidean', min_samples=min_samples, n_jobs=-1)  # eps=0.053, metric='cosine'
+    return make_pipeline(normalizer, dbs)
+
+
+# Engine name: model factory, and whether the model clusters the binary units matrix
+# (True) or the dense units and traits levels frame (False).
+CLUSTER_ENGINES: Dict[str, Tuple[Callable[..., Any], bool]] = {
+    'kmodes': (kmodes_model, False),
+    'kmeans': (kmeans_model, False),
+    'dbscan': (dbscan_model, False),
+    'minhash_lsh': (MinHashLSH, True),
+    'minibatch_kmodes': (MiniBatchKModes, True),
+    'jaccard_dbscan': (JaccardDBSCAN, True),
+}
+
+
+def get_cluster_engine(engine: str, **params) -> Tuple[Any, bool]:
+    """Clustering model of a CLUSTER_ENGINES engine.
+
+    Args:
+        engine (str): Engine name.
+        **params: Model parameters.
+
+    Raises:
+        ValueError: Unknown engine.
+
+    Returns:
+        Tuple[Any, bool]: Model with fit_predict, whether it clusters the binary units matrix.
+    """
+    if engine not in CLUSTER_ENGINES:
+        raise ValueError(f'Unknown clustering engine {engine}, one of {list(CLUSTER_ENGINES)}')
+    factory, binary = CLUSTER_ENGINES[engine]
+    return factory(**params), binary
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# coding: utf-8
+from typing import Sequence, Tuple
+
+import numpy as np
+
+# Units per word of a packed composition
+WORD_BITS: int = 64
+# Set bits of every byte
+_POPCOUNT: np.ndarray = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+
+def composition_bits(levels: np.ndarray) -> np.ndarray:
+    """Compositions packed as bitsets over the units vocabulary.
+
+    Bit `i % 64` of word `i // 64` of a row is set when unit i (column i of
+    levels) has a level > 0, rows of a same composition are equal.
+
+    Args:
+        levels (ndarray): Units levels, one row per board and one column per unit.
+
+    Returns:
+        ndarray: uint64 array of shape (rows, ceil(units / 64)).
+    """
+    present = np.asarray(levels) > 0
+    n_rows, n_units = present.shape
+    n_words = max(1, -(-n_units // WORD_BITS))
+    padded = np.zeros((n_rows, n_words * WORD_BITS), dtype=bool)
+    padded[:, :n_units] = present
+    packed = np.packbits(padded, axis=1, bitorder='little')
+    return packed.view('<u8').astype(np.uint64)
+
+
+def group_compositions(bits: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Distinct compositions and the composition of each row.
+
+    Args:
+        bits (ndarray): Packed compositions.
+
+    Returns:
+        Tuple[ndarray, ndarray]: Distinct packed compositions, index of each row in them.
+    """
+    compositions, inverse = np.unique(bits, axis=0, return_inverse=True)
+    return compositions, inverse.reshape(-1)
+
+
+def popcount(bits: np.ndarray) -> np.ndarray:
+    """Units count of packed compositions, on the last axis."""
+    bits = np.ascontiguousarray(bits, dtype=np.uint64)
+    counts = _POPCOUNT[bits.view(np.uint8)]
+    return counts.reshape(bits.shape[:-1] + (-1,)).sum(axis=-1, dtype=np.int64)
+
+
+def has_unit(bits: np.ndarray, unit: int) -> np.ndarray:
+    """Compositions with unit (its column index in the levels)."""
+    word = bits[..., unit // WORD_BITS]
+    return ((word >> np.uint64(unit % WORD_BITS)) & np.uint64(1)).astype(bool)
+
+
+def jaccard_similarity(bits: np.ndarray, other: np.ndarray) -> np.ndarray:
+    """Shared units over units of both compositions, broadcast on the leading axes.
+
+    `jaccard_similarity(bits[:, None], bits[None])` is the pairwise matrix,
+    two empty compositions are alike (1.0).
+    """
+    shared = popcount(bits & other)
+    union = popcount(bits | other)
+    return np.where(union > 0, shared / np.maximum(union, 1), 1.0)
+
+
+def composition_labels(bits: np.ndarray, labels: Sequence[str], sep: str = ', ') -> list:
+    """Text of packed compositions, the labels of their units in vocabulary order.
+
+    Args:
+        bits (ndarray): Packed compositions, only the ones to output.
+        labels (Sequence[str]): Label of each unit.
+        sep (str, optional): Units separator. Defaults to ', '.
+
+    Returns:
+        list: One str per composition.
+    """
+    bits = np.ascontiguousarray(bits, dtype=np.uint64).reshape(-1, bits.shape[-1])
+    present = np.unpackbits(bits.view(np.uint8), axis=1, bitorder='little')[:, :len(labels)].astype(bool)
+    names = np.asarray(labels, dtype=object)
+    return [sep.join(names[row]) for row in present]
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# coding: utf-8
+import asyncio
+import logging
+import random
+import time
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from pantheon.utils import exceptions as exc
+
+from .rate_limiter import RateLimiter
+
+# Errors worth another try, anything else (404, 400, 403...) is final.
+RETRIABLE_ERRORS: tuple = (exc.RateLimit, exc.ServerError, exc.Timeout)
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, server: str, method: str):
+        Exception.__init__(self, f"Circuit open for {server} {method}, call dropped")
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker of one endpoint.
+
+    Opens when at least `threshold` of the last `window` calls failed, then
+    rejects calls for `cooldown` seconds. After that a single trial call is let
+    through (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, threshold: float = 0.5, window: int = 20, min_calls: int = 5,
+                 cooldown: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.threshold = threshold
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self._clock = clock
+        self._outcomes: deque = deque(maxlen=window)
+        self._opened_at: float = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if self._clock() - self._opened_at < self.cooldown:
+            return 'open'
+        return 'half-open'
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == 'closed':
+            return True
+        if state == 'half-open' and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def release(self) -> None:
+        """End a call without outcome, e.g. rate limited: a half-open trial is let through again."""
+        self._trial = False
+
+    def record(self, success: bool) -> None:
+        if self._trial:
+            self._trial = False
+            self._outcomes.clear()
+            self._opened_at = None if success else self._clock()
+            return
+        self._outcomes.append(success)
+        failures = self._outcomes.count(False)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.threshold:
+            self._opened_at = self._clock()
+            self._outcomes.clear()
+
+
+class RequestExecutor:
+    """Runs Riot API calls under the rate limiter with retries and circuit breakers.
+
+    429s push the whole routing value back by their Retry-After, 5xx and
+    timeouts are retried with jittered exponential backoff, and an endpoint
+    failing too often is short-circuited for a while. `counters` keeps
+    calls, retried, rate_limited, dropped and failed totals.
+    """
+
+    def __init__(self, rate_limiter: RateLimiter = None, max_retries: int = 4,
+                 base_delay: float = 1.0, max_delay: float = 60.0,
+                 breaker_options: dict = {}, sleep: Callable = asyncio.sleep,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate_limiter = rate_limiter or RateLimiter(clock=clock, sleep=sleep)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker_options = breaker_options
+        self.counters: Counter = Counter()
+        self._sleep = sleep
+        self._clock = clock
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+
+    def breaker(self, server: str, method: str) -> CircuitBreaker:
+        key = (server, method)
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker(clock=self._clock, **self.breaker_options)
+        return self._breakers[key]
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter exponential backoff delay of a retry."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def call(self, server: str, method: str, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Await `func(*args, **kwargs)`, a pantheon call named `method`, on `server`.
+
+        Raises:
+            CircuitOpenError: The endpoint circuit is open.
+            Exception: The last error once retries are exhausted, or a non retriable one.
+        """
+        breaker = self.breaker(server, method)
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow():
+                self.counters['dropped'] += 1
+                raise CircuitOpenError(server, method)
+            await self.rate_limiter.acquire(server, method)
+            self.counters['calls'] += 1
+            try:
+                result = await func(*args, **kwargs)
+            except RETRIABLE_ERRORS as e:
+                if isinstance(e, exc.RateLimit):
+                    # The limiter absorbs 429s, they say nothing of the endpoint health
+                    breaker.release()
+                    # Retry-After covers every call of the routing value, not only this one
+                    self.counters['rate_limited'] += 1
+                    self.rate_limiter.penalize(server, method, e.waitFor())
+                    delay = 0
+                else:
+                    breaker.record(False)
+                    delay = self.backoff(attempt)
+                if attempt == self.max_retries:
+                    self.counters['dropped'] += 1
+                    raise
+                self.counters['retried'] += 1
+                logging.warning(f'{server} {method}: {e}, retry {attempt + 1} in {delay:.1f}s')
+                await self._sleep(delay)
+            except Exception:
+                # The endpoint answered, the request itself was wrong (404...)
+                breaker.record(True)
+                self.counters['failed'] += 1
+                raise
+            else:
+                breaker.record(True)
+                return result
+
+    def __str__(self):
+        return ', '.join(f'{key}: {value}' for key, value in sorted(self.counters.items()))
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# coding: utf-8
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Sequence
+
+# Marks the end of a queue for its consumer.
+_DONE = object()
+
+
+async def map_bounded(func: Callable[[Any], Awaitable[Any]], items: Sequence,
+                      workers: int = 8) -> list:
+    """Await `func` on every item with at most `workers` calls in flight.
+
+    Args:
+        func (Callable): Coroutine function called with one item.
+        items (Sequence): Items to process.
+        workers (int, optional): Max concurrent calls. Defaults to 8.
+
+    Returns:
+        list: Results in the order of `items`.
+    """
+    results: list = [None] * len(items)
+    # Workers share one iterator, so each item is taken exactly once.
+    indexed = iter(enumerate(items))
+
+    async def work():
+        for index, item in indexed:
+            results[index] = await func(item)
+
+    await asyncio.gather(*[work() for _ in range(max(1, min(workers, len(items))))])
+    return results
+
+
+class FetchPipeline:
+    """Producer/consumer pipeline streaming fetched documents into a writer.
+
+    Ids are `put` into a bounded queue, a fixed pool of workers fetches them and
+    a single writer flushes results in batches as they arrive. Bounded queues
+    give backpressure: producers wait once workers fall behind, and at most
+    about `workers + 2 * batch_size` documents are held in memory at any time.
+    """
+
+    def __init__(self, fetch: Callable[[Any], Awaitable[Any]],
+                 write: Callable[[List[Any]], Any],
+                 workers: int = 8, batch_size: int = 50, queue_size: int = None,
+                 flush_interval: float = None):
+        """
+        Args:
+            fetch (Callable): Coroutine function fetching one document by id.
+            write (Callable): Blocking function writing a list of documents, run in a thread.
+                When it raises, the ids of the batch count as failed.
+            workers (int, optional): Number of concurrent fetches. Defaults to 8.
+            batch_size (int, optional): Documents per write. Defaults to 50.
+            queue_size (int, optional): Max queued ids. Defaults to 2 * workers.
+            flush_interval (float, optional): Seconds after which a partial batch is
+                written anyway, for pipelines fed forever. Defaults to None, never.
+        """
+        self.fetch = fetch
+        self.write = write
+        self.workers = workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._ids: asyncio.Queue = asyncio.Queue(maxsize=queue_size or 2 * workers)
+        self._results: asyncio.Queue = asyncio.Queue(maxsize=2 * batch_size)
+        self._tasks: list = []
+        self._writer = None
+        self.fetched = 0
+        self.failed = 0
+        self.written = 0
+        # Ids whose fetch or write raised, until taken back for a retry
+        self.failed_ids: list = []
+
+    def start(self) -> 'FetchPipeline':
+        self._tasks = [asyncio.create_task(self._work())
+                       for _ in range(self.workers)]
+        self._writer = asyncio.create_task(self._write())
+        return self
+
+    async def put(self, id) -> None:
+        """Queue one id, waiting while the pipeline is full."""
+        await self._ids.put(id)
+
+    def take_failed(self) -> list:
+        """Ids whose fetch or write failed since the last call, for long running pipelines to retry."""
+        failed_ids, self.failed_ids = self.failed_ids, []
+        return failed_ids
+
+    async def join(self) -> int:
+        """Drain the pipeline and stop its workers.
+
+        Returns:
+            int: Number of documents written.
+        """
+        for _ in self._tasks:
+            await self._ids.put(_DONE)
+        await asyncio.gather(*self._tasks)
+        await self._results.put(_DONE)
+        await self._writer
+        return self.written
+
+    async def _work(self) -> None:
+        while (id := await self._ids.get()) is not _DONE:
+            try:
+                document = await self.fetch(id)
+            except Exception as e:
+                logging.error(f'{id}: {e}')
+                self.failed += 1
+                self.failed_ids.append(id)
+                continue
+            if document is not None:
+                self.fetched += 1
+                await self._results.put((id, document))
+
+    async def _write(self) -> None:
+        batch: list = []
+        loop = asyncio.get_running_loop()
+        while True:
+            # Time left before the oldest document of the batch is due a write
+            timeout = None
+            if batch and self.flush_interval is not None:
+                timeout = max(0, batch_started + self.flush_interval - loop.time())
+            try:
+                result = await asyncio.wait_for(self._results.get(), timeout)
+            except asyncio.TimeoutError:
+                await self._flush(batch)
+                batch = []
+                continue
+            if result is _DONE:
+                break
+            if not batch:
+                batch_started = loop.time()
+            batch.append(result)
+            if len(batch) >= self.batch_size:
+                await self._flush(batch)
+                batch = []
+        if batch:
+            await self._flush(batch)
+
+    async def _flush(self, batch: list) -> None:
+        """Write a batch of (id, document), its ids are failed ones when the write raises."""
+        ids = [id for id, _ in batch]
+        try:
+            await asyncio.to_thread(self.write, [document for _, document in batch])
+            self.written += len(batch)
+        except Exception as e:
+            logging.error(e)
+            self.failed += len(batch)
+            self.failed_ids.extend(ids)
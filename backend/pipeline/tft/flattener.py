@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# coding: utf-8
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Column kinds: unit levels are ints, trait levels floats, the rest strings.
+# Ints are stored with floats until known to have no missing value.
+INT, FLOAT, TEXT = 'int', 'float', 'text'
+
+
+class MatchFlattener:
+    """Flattens TFT match details into one row per participant, column by column.
+
+    Gives the rows and columns of `process_matches` + `pd.json_normalize`:
+    `_id`, `match_id`, `placement`, `augment{n}`, one level per trait
+    (tier_current / tier_total * 12) and per unit (tier * rarity), and
+    `{unit}_item{n}` item names. Only columns holding a value are returned.
+
+    Column names are resolved through a vocabulary seeded from the TFT assets
+    and grown with units or traits they do not know. Values are gathered per
+    batch of matches as (row, column, value) triplets, then scattered at once
+    into a float and a string 2D array allocated for all rows.
+    """
+
+    def __init__(self, units: Iterable[str] = (), traits: Iterable[str] = (),
+                 items_per_unit: int = 3, batch_size: int = 10000):
+        """
+        Args:
+            units (Iterable[str], optional): Known units character_id. Defaults to ().
+            traits (Iterable[str], optional): Known traits name. Defaults to ().
+            items_per_unit (int, optional): Item slots of a known unit. Defaults to 3.
+            batch_size (int, optional): Matches gathered before each scatter. Defaults to 10000.
+        """
+        self.items_per_unit = items_per_unit
+        self.batch_size = batch_size
+        self.columns: Dict[str, int] = {}
+        self.kinds: List[str] = []
+        # Hot lookups without building the column name
+        self._units: Dict[str, int] = {}
+        self._items: Dict[str, List[int]] = {}
+        self._augments: Dict[int, int] = {}
+        for name, kind in [('_id', TEXT), ('match_id', TEXT), ('placement', INT)]:
+            self.column(name, kind)
+        for trait in traits:
+            self.column(trait, FLOAT)
+        for unit in units:
+            self.unit_column(unit)
+            for item_index in range(items_per_unit):
+                self.item_column(unit, item_index)
+
+    @classmethod
+    def from_assets(cls, tft_assets: dict, **kwargs) -> 'MatchFlattener':
+        """Vocabulary of every set of the assets, https://raw.communitydragon.org/latest/cdragon/tft/en_us.json"""
+        tft_sets: list = list(tft_assets.get('sets', {}).values())
+        return cls(units=[champion['apiName'] for tft_set in tft_sets for champion in tft_set['champions']],
+                   traits=[trait['apiName'] for tft_set in tft_sets for trait in tft_set['traits']], **kwargs)
+
+    def column(self, name: str, kind: str) -> int:
+        if name not in self.columns:
+            self.columns[name] = len(self.kinds)
+            self.kinds.append(kind)
+        return self.columns[name]
+
+    def unit_column(self, unit: str) -> int:
+        if unit not in self._units:
+            self._units[unit] = self.column(unit, INT)
+        return self._units[unit]
+
+    def item_column(self, unit: str, item_index: int) -> int:
+        slots: list = self._items.setdefault(unit, [])
+        while len(slots) <= item_index:
+            slots.append(self.column(f'{unit}_item{len(slots)}', TEXT))
+        return slots[item_index]
+
+    def item_columns(self, unit: str, count: int) -> List[int]:
+        """Columns of the first `count` item slots of unit."""
+        slots: list = self._items.get(unit, [])
+        if len(slots) < count:
+            slots = [self.item_column(unit, item_index) for item_index in range(count)]
+        return slots[:count]
+
+    def augment_column(self, augment_index: int) -> int:
+        if augment_index not in self._augments:
+            self._augments[augment_index] = self.column(f'augment{augment_index}', TEXT)
+        return self._augments[augment_index]
+
+    def flatten(self, matches: Sequence[dict]) -> pd.DataFrame:
+        """One row per participant of matches, in matches order.
+
+        Args:
+            matches (Sequence[dict]): MatchDto from the API.
+
+        Returns:
+            DataFrame: Flattened matches, NaN where a participant has no value.
+        """
+        n_rows: int = sum(len(match['info']['participants']) for match in matches)
+        blocks: dict = {FLOAT: _Block(n_rows, np.float64), TEXT: _Block(n_rows, object)}
+        row = 0
+        for start in range(0, len(matches), self.batch_size):
+            row = self._flatten_batch(matches[start:start + self.batch_size], row, blocks)
+
+        names: list = list(self.columns)
+        frames: list = [pd.DataFrame(block.values(), columns=[names[index] for index in block.columns], copy=False)
+                        for block in [blocks[TEXT], blocks[FLOAT]]]
+        df = pd.concat(frames, axis=1, copy=False)
+        # Like json_normalize, ints are only floats when missing somewhere
+        for index in blocks[FLOAT].columns:
+            if self.kinds[index] == INT and df[names[index]].notna().all():
+                df[names[index]] = df[names[index]].astype(np.int64)
+        return df
+
+    def _flatten_batch(self, matches: Sequence[dict], row: int, blocks: dict) -> int:
+        columns, column = self.columns, self.column
+        units, unit_column = self._units, self.unit_column
+        items, item_columns = self._items, self.item_columns
+        augments, augment_column = self._augments, self.augment_column
+        id_column, match_id_column = columns['_id'], columns['match_id']
+        placement_column = columns['placement']
+        # Values of the batch by kind, rows are rebuilt from per row counts
+        first_row: int = row
+        number_columns, number_values, number_counts = [], [], []
+        text_columns, text_values, text_counts = [], [], []
+
+        for match in matches:
+            match_id: str = match['metadata']['match_id']
+            for participant in match['info']['participants']:
+                # Dicts keep the last value of a cell, like process_matches
+                numbers: dict = {placement_column: participant['placement']}
+                texts: dict = {id_column: match_id + '-' + participant['puuid'], match_id_column: match_id}
+                for index, augment in enumerate(participant['augments']):
+                    texts[augments[index] if index in augments else augment_column(index)] = augment
+                for trait in participant['traits']:
+                    name = trait['name']
+                    numbers[columns[name] if name in columns else column(name, FLOAT)] = \
+                        trait['tier_current'] / trait['tier_total'] * 12
+                for unit in participant['units']:
+                    character_id = unit['character_id']
+                    numbers[units[character_id] if character_id in units else unit_column(character_id)] = \
+                        unit['tier'] * unit['rarity']
+                    names = unit['itemNames']
+                    if names:
+                        slots = items.get(character_id, ())
+                        if len(slots) < len(names):
+                            slots = item_columns(character_id, len(names))
+                        for slot, item in zip(slots, names):
+                            texts[slot] = item.split('_')[-1]
+                number_columns += numbers.keys()
+                number_values += numbers.values()
+                number_counts.append(len(numbers))
+                text_columns += texts.keys()
+                text_values += texts.values()
+                text_counts.append(len(texts))
+                row += 1
+
+        batch_rows = np.arange(first_row, row)
+        blocks[FLOAT].write(np.repeat(batch_rows, number_counts), number_columns,
+                            np.array(number_values, dtype=np.float64), len(self.kinds))
+        blocks[TEXT].write(np.repeat(batch_rows, text_counts), text_columns,
+                           np.array(text_values, dtype=object), len(self.kinds))
+        return row
+
+
+class _Block:
+    """Column-major 2D array of one dtype, holding the vocabulary columns in use.
+
+    Column-major is the memory layout of a pandas block, so the DataFrame is
+    built on it without a copy. Columns get a position the first time they
+    hold a value, the array doubles its width when full.
+    """
+
+    def __init__(self, n_rows: int, dtype):
+        self.n_rows = n_rows
+        self.dtype = dtype
+        self.columns: List[int] = []
+        self._positions = np.full(0, -1, dtype=np.int64)
+        self._values = self._allocate(0)
+
+    def _allocate(self, width: int) -> np.ndarray:
+        return np.full((self.n_rows, width), np.nan, dtype=self.dtype, order='F')
+
+    def values(self) -> np.ndarray:
+        return self._values[:, :len(self.columns)]
+
+    def write(self, rows: np.ndarray, columns: list, values: np.ndarray, vocabulary_size: int) -> None:
+        """Set values at (rows, vocabulary columns), every cell at most once."""
+        if not len(rows):
+            return
+        columns = np.array(columns, dtype=np.int64)
+        if len(self._positions) < vocabulary_size:
+            self._positions = np.r_[self._positions, np.full(vocabulary_size - len(self._positions), -1)]
+        # Give a position to the columns used for the first time
+        present = np.zeros(vocabulary_size, dtype=bool)
+        present[columns] = True
+        new_columns = np.flatnonzero(present & (self._positions < 0))
+        if len(new_columns):
+            width = len(self.columns) + len(new_columns)
+            if width > self._values.shape[1]:
+                values_grown = self._allocate(max(width, 2 * self._values.shape[1]))
+                values_grown[:, :len(self.columns)] = self.values()
+                self._values = values_grown
+            self._positions[new_columns] = np.arange(len(self.columns), width)
+            self.columns += new_columns.tolist()
+        self._values[rows, self._positions[columns]] = values
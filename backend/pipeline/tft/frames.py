@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# coding: utf-8
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Documents per cursor batch of load_frame_db
+CURSOR_BATCH_SIZE: int = 1000
+# Smallest first, integral columns get the first one holding their range.
+SMALL_INT_DTYPES: tuple = (np.int8, np.int16, np.int32)
+
+
+def impute(df: pd.DataFrame, number=0, text: str = 'None', default_date: str = '2020-01-01',
+           downcast: bool = True) -> pd.DataFrame:
+    """Fill missing values of a wide match frame, one operation per dtype block.
+
+    Numeric columns are filled with `number` and object ones with `text` as 2D
+    arrays instead of column by column. Dates get `default_date`, categories
+    `text`, other dtypes (bool) are kept. With downcast, numeric columns only
+    holding integers (unit and trait levels, placement) get the smallest int
+    dtype of their range, a trait level like 2.4 keeps its float.
+
+    Args:
+        df (DataFrame): Frame with NaN, like flattened matches.
+        number (optional): Numeric fill value. Defaults to 0.
+        text (str, optional): Object and category fill value. Defaults to 'None'.
+        default_date (str, optional): Dates fill value. Defaults to '2020-01-01'.
+        downcast (bool, optional): Downcast integral numeric columns. Defaults to True.
+
+    Returns:
+        DataFrame: New frame with the columns and index of df.
+    """
+    parts: list = []
+    for kind in ['float', 'integer']:
+        block = df.select_dtypes(include=kind)
+        if not block.shape[1]:
+            continue
+        values: np.ndarray = block.to_numpy()
+        if kind == 'float':
+            values[np.isnan(values)] = number
+        if not downcast:
+            parts.append(pd.DataFrame(values, index=df.index, columns=block.columns, copy=False))
+            continue
+        for columns, column_values in _downcast(values):
+            parts.append(pd.DataFrame(column_values, index=df.index, columns=block.columns[columns], copy=False))
+
+    block = df.select_dtypes(include='object')
+    if block.shape[1]:
+        values = block.to_numpy()
+        values[pd.isna(values)] = text
+        parts.append(pd.DataFrame(values, index=df.index, columns=block.columns, copy=False))
+
+    # Few columns, filled one by one
+    block = df.select_dtypes(include=['datetime', 'category'])
+    for name, column in block.items():
+        if not column.hasnans:
+            continue
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            if text not in column.cat.categories:
+                column = column.cat.add_categories([text])
+            block[name] = column.fillna(text)
+        else:
+            block[name] = column.fillna(pd.to_datetime(default_date))
+    parts.append(block)
+
+    parts.append(df.select_dtypes(exclude=['number', 'object', 'datetime', 'category']))
+    return pd.concat(parts, axis=1, copy=False)[df.columns]
+
+
+def _downcast(values: np.ndarray) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """(columns, values) blocks of a filled numeric 2D array, by smallest fitting dtype."""
+    if not len(values):
+        return [(np.arange(values.shape[1]), values)]
+    integral = np.isfinite(values).all(axis=0)
+    if values.dtype.kind == 'f':
+        integral &= (values == np.trunc(values)).all(axis=0)
+    lows, highs = values.min(axis=0), values.max(axis=0)
+    blocks: list = []
+    remaining = np.ones(values.shape[1], dtype=bool)
+    for dtype in SMALL_INT_DTYPES:
+        info = np.iinfo(dtype)
+        fits = remaining & integral & (lows >= info.min) & (highs <= info.max)
+        if fits.any():
+            blocks.append((np.flatnonzero(fits), values[:, fits].astype(dtype)))
+            remaining &= ~fits
+    if remaining.any():
+        blocks.append((np.flatnonzero(remaining), values[:, remaining]))
+    return blocks
+
+
+def load_frame_db(collection, query: dict = {}, columns: Optional[List[str]] = None,
+                  batch_size: int = CURSOR_BATCH_SIZE) -> pd.DataFrame:
+    """DataFrame of the documents of a collection, built from its cursor batch by batch.
+
+    Gives `pd.DataFrame(list(collection.find(query)))` without holding every
+    decoded document next to the frame: each batch of `batch_size` documents
+    is appended to a FrameBuilder sized by a count of the query, then dropped.
+
+    Args:
+        collection (Collection): Mongo collection.
+        query (dict, optional): Filter of the documents. Defaults to {}.
+        columns (List[str], optional): Fields to load, all when None. Defaults to None.
+        batch_size (int, optional): Documents per cursor batch. Defaults to CURSOR_BATCH_SIZE.
+
+    Returns:
+        DataFrame: One row per document, columns in order of appearance or of columns.
+    """
+    projection: Optional[dict] = None
+    if columns is not None:
+        projection = {column: 1 for column in columns}
+        projection.setdefault('_id', 0)
+    builder = FrameBuilder(n_rows=collection.count_documents(query))
+    batch: list = []
+    for document in collection.find(query, projection, batch_size=batch_size):
+        batch.append(document)
+        if len(batch) == batch_size:
+            builder.append(batch)
+            batch = []
+    if batch:
+        builder.append(batch)
+    return builder.frame(columns)
+
+
+class FrameBuilder:
+    """Appends batches of documents into preallocated columns.
+
+    Each batch goes through a small DataFrame, its columns are copied into one
+    array per column allocated for n_rows (grown if more come). A column
+    missing from some rows gets NaN, ints with a missing value become floats
+    and mixed kinds objects, like one DataFrame of all the documents.
+
+    Repeated strings (items, augments, 'None') are shared across batches
+    instead of one string object per decoded document.
+    """
+
+    def __init__(self, n_rows: int = 0, share_strings: bool = True):
+        """
+        Args:
+            n_rows (int, optional): Expected rows, the columns capacity. Defaults to 0.
+            share_strings (bool, optional): Share repeated strings. Defaults to True.
+        """
+        self.n_rows = 0
+        self.capacity = n_rows
+        self.share_strings = share_strings
+        self.columns: Dict[str, np.ndarray] = {}
+        self._strings: dict = {}
+
+    def append(self, documents: Sequence[dict]) -> None:
+        batch = pd.DataFrame(documents)
+        start, end = self.n_rows, self.n_rows + len(batch)
+        if end > self.capacity:
+            self._grow(max(end, 2 * self.capacity))
+        for name, column in batch.items():
+            values: np.ndarray = column.to_numpy()
+            if values.dtype == object and self.share_strings:
+                values = self._share_strings(values)
+            if name not in self.columns:
+                # Rows before this batch are missing
+                self.columns[name] = _allocate(self.capacity, _with_missing(values.dtype) if start else values.dtype)
+            self._ensure_dtype(name, _common_dtype(self.columns[name].dtype, values.dtype))
+            self.columns[name][start:end] = values
+        for name in self.columns.keys() - set(batch.columns):
+            self._ensure_dtype(name, _with_missing(self.columns[name].dtype))
+            self.columns[name][start:end] = _missing(self.columns[name].dtype)
+        self.n_rows = end
+
+    def frame(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Rows appended so far, with the given columns (object NaN when never seen) or all."""
+        if columns is None:
+            columns = list(self.columns)
+        data: dict = {name: self.columns[name][:self.n_rows] if name in self.columns
+                      else np.full(self.n_rows, np.nan, dtype=object) for name in columns}
+        return pd.DataFrame(data, columns=columns, copy=False)
+
+    def _grow(self, capacity: int) -> None:
+        for name, values in self.columns.items():
+            grown = _allocate(capacity, values.dtype)
+            grown[:self.n_rows] = values[:self.n_rows]
+            self.columns[name] = grown
+        self.capacity = capacity
+
+    def _ensure_dtype(self, name: str, dtype: np.dtype) -> None:
+        if self.columns[name].dtype != dtype:
+            values = _allocate(self.capacity, dtype)
+            values[:self.n_rows] = self.columns[name][:self.n_rows]
+            self.columns[name] = values
+
+    def _share_strings(self, values: np.ndarray) -> np.ndarray:
+        try:
+            codes, uniques = pd.factorize(values)
+        except TypeError:  # Unhashable, lists or dicts
+            return values
+        # Ids and other unique strings are not worth it
+        if 2 * len(uniques) > len(values) or not all(isinstance(value, str) for value in uniques):
+            return values
+        shared = np.empty(len(uniques) + 1, dtype=object)
+        shared[:-1] = [self._strings.setdefault(value, value) for value in uniques]
+        shared[-1] = np.nan
+        return shared[codes]
+
+
+def _allocate(capacity: int, dtype: np.dtype) -> np.ndarray:
+    if dtype.kind in 'iub':
+        return np.empty(capacity, dtype=dtype)
+    return np.full(capacity, _missing(dtype), dtype=dtype)
+
+
+def _missing(dtype: np.dtype):
+    return np.datetime64('NaT') if dtype.kind == 'M' else np.nan
+
+
+def _with_missing(dtype: np.dtype) -> np.dtype:
+    """dtype holding dtype values and NaN"""
+    if dtype.kind in 'iu':
+        return np.dtype(np.float64)
+    if dtype.kind == 'b':
+        return np.dtype(object)
+    return dtype
+
+
+def _common_dtype(dtype: np.dtype, other: np.dtype) -> np.dtype:
+    if dtype == other:
+        return dtype
+    if dtype.kind in 'iuf' and other.kind in 'iuf':
+        return np.result_type(dtype, other)
+    return np.dtype(object)
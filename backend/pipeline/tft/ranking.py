@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# coding: utf-8
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+ITEMS_PER_UNIT: int = 3
+# Placements counted in the top 4 rate, and z of the two-sided 95% confidence interval
+TOP4: int = 4
+CI_Z: float = 1.96
+
+
+def placement_stats(groups: np.ndarray, placements: np.ndarray, n_groups: int) -> Dict[str, np.ndarray]:
+    """Placement statistics of every group in one pass of np.bincount.
+
+    The confidence interval of an average placement is the normal one,
+    mean +- CI_Z * std / sqrt(count), NaN for a group of one placement.
+
+    Args:
+        groups (ndarray): Group of each placement, from 0 to n_groups - 1.
+        placements (ndarray): Placements.
+        n_groups (int): Groups count.
+
+    Returns:
+        Dict[str, ndarray]: count, average_placement, ci_low, ci_high and top4_rate, not rounded.
+    """
+    placements = np.asarray(placements, dtype=np.float64)
+    counts = np.bincount(groups, minlength=n_groups)
+    sums = np.bincount(groups, weights=placements, minlength=n_groups)
+    squares = np.bincount(groups, weights=placements * placements, minlength=n_groups)
+    tops = np.bincount(groups, weights=(placements <= TOP4).astype(np.float64), minlength=n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = sums / counts
+        variances = np.maximum(squares - sums * means, 0) / (counts - 1)
+        half_widths = CI_Z * np.sqrt(variances / counts)
+        return {'count': counts, 'average_placement': means, 'ci_low': means - half_widths,
+                'ci_high': means + half_widths, 'top4_rate': tops / counts}
+
+
+def rank_placements(df: pd.DataFrame, by, count_name: str = 'value_count', min_count: int = 0,
+                    decimals: int = 2) -> pd.DataFrame:
+    """Placement statistics of each group of df, best average placement first.
+
+    Groups are numbered by a native groupby, their stats come from
+    placement_stats and are rounded once. Ties keep the groups order.
+
+    Args:
+        df (DataFrame): Rows with a placement column.
+        by (str or list): Group columns.
+        count_name (str, optional): Name of the count column. Defaults to 'value_count'.
+        min_count (int, optional): Groups seen less often are dropped. Defaults to 0.
+        decimals (int, optional): Decimals of the stats. Defaults to 2.
+
+    Returns:
+        DataFrame: by columns, count_name, average_placement, ci_low, ci_high, top4_rate.
+    """
+    grouped = df.groupby(by, observed=True, sort=True)
+    groups = grouped.ngroup()
+    grouped_rows = groups.notna().to_numpy()  # Not a NaN key
+    ranking = grouped.size().index.to_frame(index=False)
+    stats = placement_stats(groups.to_numpy()[grouped_rows].astype(np.int64),
+                            df['placement'].to_numpy()[grouped_rows], len(ranking))
+    ranking = _with_stats(ranking, stats, count_name, decimals)
+    ranking = ranking[ranking[count_name] >= min_count]
+    return ranking.sort_values(by='average_placement', kind='stable')
+
+
+def _with_stats(df: pd.DataFrame, stats: Dict[str, np.ndarray], count_name: str, decimals: int) -> pd.DataFrame:
+    for name, values in stats.items():
+        if name == 'count':
+            df[count_name] = values
+        else:
+            df[name] = np.round(values, decimals)
+    return df
+
+
+def unit_items_ranking(df: pd.DataFrame, units: Sequence[str], min_count: int = 0,
+                       items_per_unit: int = ITEMS_PER_UNIT) -> pd.DataFrame:
+    """Items builds of every unit ranked by average placement, in one aggregation.
+
+    A build is the sorted `{unit}_item{n}` names of a row ('None' included),
+    joined by ', ', for every row of df. Item names are coded in a sorted
+    vocabulary, so sorting the codes of a row sorts its names and the codes
+    of the unit and its build make one integer key. The stats of all keys
+    come from one placement_stats.
+
+    Args:
+        df (DataFrame): Matches with placement and `{unit}_item{n}` columns.
+        units (Sequence[str]): Units to rank, the output order.
+        min_count (int, optional): Builds seen less often are dropped. Defaults to 0.
+        items_per_unit (int, optional): Item columns of a unit. Defaults to ITEMS_PER_UNIT.
+
+    Returns:
+        DataFrame: unit, items, value_count and placement_stats columns. Units
+            in order, builds by average placement then name.
+    """
+    slots: List[List[str]] = [[f'{unit}_item{index}' for index in range(items_per_unit)
+                               if f'{unit}_item{index}' in df] for unit in units]
+    column_codes: Dict[str, tuple] = {column: pd.factorize(df[column]) for unit_slots in slots
+                                      for column in unit_slots}
+    vocabulary: list = sorted({str(name) for _, names in column_codes.values() for name in names} |
+                              {'nan' for codes, _ in column_codes.values() if (codes < 0).any()})
+    # An empty slot (unit with fewer item columns) sorts after every name
+    empty = len(vocabulary)
+    base = empty + 1
+    ids: dict = {name: index for index, name in enumerate(vocabulary)}
+
+    builds = np.full((len(df), len(units), items_per_unit), empty, dtype=np.int32)
+    for unit_index, unit_slots in enumerate(slots):
+        for slot, column in enumerate(unit_slots):
+            codes, names = column_codes[column]
+            # Codes of the column to codes of the vocabulary, -1 (NaN) last
+            lookup = np.array([ids[str(name)] for name in names] + [ids.get('nan', empty)], dtype=np.int64)
+            builds[:, unit_index, slot] = lookup[codes]
+    builds.sort(axis=2)
+    keys = np.arange(len(units), dtype=np.int64)[None, :]
+    for slot in range(items_per_unit):
+        keys = keys * base + builds[:, :, slot]
+
+    placements = np.broadcast_to(df['placement'].to_numpy(dtype=np.float64)[:, None], keys.shape)
+    groups, inverse = np.unique(keys.ravel(), return_inverse=True)
+    stats = placement_stats(inverse, placements.ravel(), len(groups))
+    kept = stats['count'] >= min_count
+    groups = groups[kept]
+    stats = {name: values[kept] for name, values in stats.items()}
+
+    # Decode the kept keys, builds slot by slot from the last one
+    names = np.array(vocabulary + [''], dtype=object)
+    group_builds = []
+    rest = groups
+    for _ in range(items_per_unit):
+        group_builds.append(rest % base)
+        rest = rest // base
+    unit_names = np.asarray(units, dtype=object)[rest]
+    items = [', '.join(names[code] for code in build if code != empty)
+             for build in zip(*reversed(group_builds))]
+
+    ranking = _with_stats(pd.DataFrame({'unit': unit_names, 'items': np.asarray(items, dtype=object)}),
+                          stats, 'value_count', decimals=2)
+    order = np.lexsort((ranking['average_placement'].to_numpy(), rest))
+    return ranking.iloc[order].reset_index(drop=True)
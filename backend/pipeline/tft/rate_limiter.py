@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# coding: utf-8
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Dict, List, Tuple
+
+# Riot development key budgets, shared by every endpoint of one routing value.
+# https://developer.riotgames.com/docs/portal#web-apis_rate-limiting
+APP_LIMITS: List[Tuple[int, int]] = [(20, 1), (100, 120)]
+
+# Per endpoint budgets (limit, seconds), named after the pantheon methods.
+METHOD_LIMITS: Dict[str, List[Tuple[int, int]]] = {
+    'get_tft_challenger_league': [(30, 10), (500, 600)],
+    'get_tft_grandmaster_league': [(30, 10), (500, 600)],
+    'get_tft_master_league': [(30, 10), (500, 600)],
+    'get_tft_match': [(200, 10)],
+    'get_tft_matchlist': [(400, 10)],
+    'get_tft_summoner': [(2000, 60)],
+    'get_tft_summoner_by_name': [(2000, 60)],
+    'get_tft_summoner_by_puuId': [(2000, 60)],
+}
+
+# Endpoints served by the regional routing cluster instead of the platform.
+REGION_METHODS: set = {'get_tft_match', 'get_tft_matchlist'}
+
+# Same routing as pantheon, so budgets follow where requests are really sent.
+PLATFORMS_TO_REGIONS: Dict[str, str] = {
+    'br1': 'americas', 'eun1': 'europe', 'euw1': 'europe', 'jp1': 'asia',
+    'kr': 'asia', 'la1': 'americas', 'la2': 'americas', 'na1': 'americas',
+    'oc1': 'americas', 'tr1': 'europe', 'ru': 'europe',
+}
+
+
+def routing_value(server: str, method: str) -> str:
+    """Routing value whose budget a call is charged to.
+
+    Args:
+        server (str): Platform, e.g. 'na1', 'euw1', 'kr'.
+        method (str): Pantheon method name, e.g. 'get_tft_match'.
+
+    Returns:
+        str: Regional cluster for match endpoints, the platform otherwise.
+    """
+    if method in REGION_METHODS:
+        return PLATFORMS_TO_REGIONS.get(server, server)
+    return server
+
+
+class TokenBucket:
+    """Bucket of `limit` tokens where a spent token comes back one full `period` later.
+
+    Refilling only after a whole period (instead of continuously) means no
+    window of `period` seconds ever sees more than `limit` calls, which is
+    what Riot enforces on its fixed windows.
+    """
+
+    def __init__(self, limit: int, period: float):
+        self.limit = limit
+        self.period = period
+        self._spent: deque = deque()
+
+    def _refill(self, now: float) -> None:
+        while self._spent and self._spent[0] + self.period <= now:
+            self._spent.popleft()
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available, 0 if one is available now."""
+        self._refill(now)
+        if len(self._spent) < self.limit:
+            return 0.0
+        return self._spent[0] + self.period - now
+
+    def take(self, now: float) -> None:
+        self._spent.append(now)
+
+    def block(self, until: float) -> None:
+        """Spend every token so none is available before `until`."""
+        self._spent = deque([until - self.period] * self.limit)
+
+
+class RateLimiter:
+    """Client side scheduler for Riot app and method rate limits.
+
+    One instance is meant to be shared by every coroutine of a process, so that
+    several leagues and servers hitting the same platform or regional cluster
+    draw from one budget instead of each assuming it owns the whole quota.
+    """
+
+    def __init__(self, app_limits: List[Tuple[int, int]] = APP_LIMITS,
+                 method_limits: Dict[str, List[Tuple[int, int]]] = METHOD_LIMITS,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable = asyncio.sleep,
+                 margin: float = 0.05):
+        self.app_limits = [tuple(limit) for limit in app_limits]
+        self.method_limits = method_limits
+        self.margin = margin
+        self._clock = clock
+        self._sleep = sleep
+        self._buckets: Dict[Tuple[str, str], List[TokenBucket]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._loop = None
+
+    def _get_buckets(self, routing: str, method: str = None) -> List[TokenBucket]:
+        key = (routing, method)
+        if key not in self._buckets:
+            limits = self.app_limits if method is None else self.method_limits.get(method, [])
+            self._buckets[key] = [TokenBucket(limit, period)
+                                  for limit, period in limits]
+        return self._buckets[key]
+
+    async def acquire(self, server: str, method: str) -> None:
+        """Wait until both the app and the method budget allow one more call.
+
+        Args:
+            server (str): Platform the call is made for, e.g. 'na1'.
+            method (str): Pantheon method name, e.g. 'get_tft_match'.
+        """
+        routing = routing_value(server, method)
+        buckets = self._get_buckets(routing) + self._get_buckets(routing, method)
+        # Locks belong to one event loop, budgets outlive it.
+        if self._loop is not asyncio.get_running_loop():
+            self._loop = asyncio.get_running_loop()
+            self._locks = {}
+        lock = self._locks.setdefault(routing, asyncio.Lock())
+        # Waiting under the routing lock keeps callers in FIFO order.
+        async with lock:
+            while True:
+                now = self._clock()
+                wait = max([bucket.delay(now) for bucket in buckets], default=0.0)
+                if wait <= 0:
+                    for bucket in buckets:
+                        bucket.take(now)
+                    return
+                await self._sleep(wait + self.margin)
+
+    def penalize(self, server: str, method: str, retry_after: float) -> None:
+        """Hold back every call of a routing value after the server answered 429.
+
+        Args:
+            server (str): Platform the rejected call was made for.
+            method (str): Pantheon method name of the rejected call.
+            retry_after (float): Seconds from the Retry-After header.
+        """
+        routing = routing_value(server, method)
+        until = self._clock() + retry_after
+        for bucket in self._get_buckets(routing):
+            bucket.block(until)
+
+    def __str__(self):
+        now = self._clock()
+        s = 'Rate limits :\n'
+        for (routing, method), buckets in self._buckets.items():
+            for bucket in buckets:
+                bucket._refill(now)
+                s += f'\t{routing} {method or "App"}: {len(bucket._spent)}/{bucket.limit} per {bucket.period}s\n'
+        return s
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# coding: utf-8
+import heapq
+import itertools
+import time
+from typing import Callable, Dict, Hashable, List
+
+
+class PollScheduler:
+    """Priority queue of summoners by the time their matchlist is due a poll.
+
+    Each summoner has its own poll interval, between `min_interval` and
+    `max_interval` seconds. It is halved when a poll finds new games and doubled
+    when it finds none, so active summoners are polled often and idle ones
+    rarely. `bump` makes a summoner due at once, e.g. when the ladder shows
+    more games than at its last poll.
+    """
+
+    def __init__(self, min_interval: float = 120.0, max_interval: float = 3600.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._clock = clock
+        # Heap of (due, seq, key), superseded entries are skipped when popped
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._due: Dict[Hashable, float] = {}
+        self._interval: Dict[Hashable, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def __contains__(self, key) -> bool:
+        return key in self._due
+
+    def schedule(self, key, delay: float = 0) -> None:
+        """Make `key` due in `delay` seconds, adding it if unknown."""
+        due = self._clock() + delay
+        self._interval.setdefault(key, self.min_interval)
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, next(self._seq), key))
+
+    def bump(self, key) -> None:
+        """Poll `key` as soon as possible and at the shortest interval from now on."""
+        self._interval[key] = self.min_interval
+        self.schedule(key)
+
+    def remove(self, key) -> None:
+        self._due.pop(key, None)
+        self._interval.pop(key, None)
+
+    def pop_due(self, limit: int = None) -> List:
+        """Take the keys due now, most overdue first.
+
+        Taken keys are out of the queue until `done` or `schedule` puts them back.
+        """
+        now = self._clock()
+        keys: list = []
+        while self._heap and self._heap[0][0] <= now and (limit is None or len(keys) < limit):
+            due, _, key = heapq.heappop(self._heap)
+            if self._due.get(key) == due:
+                del self._due[key]
+                keys.append(key)
+        return keys
+
+    def done(self, key, new_games: int = 0) -> None:
+        """Reschedule `key` after a poll that found `new_games` games."""
+        if key not in self._interval:  # removed while being polled
+            return
+        interval = self._interval[key] / 2 if new_games else self._interval[key] * 2
+        self._interval[key] = min(self.max_interval, max(self.min_interval, interval))
+        self.schedule(key, self._interval[key])
+
+    def next_due(self) -> float:
+        """Seconds until the next key is due, None if the queue is empty."""
+        while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - self._clock())
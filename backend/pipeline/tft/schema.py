@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# coding: utf-8
+import re
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# Column kinds of the wide match frame, by column name.
+PLACEMENT, LEVEL, ITEM, AUGMENT = 'placement', 'level', 'item', 'augment'
+
+ITEM_COLUMN = re.compile(r'_item\d+$')
+AUGMENT_COLUMN = re.compile(r'^augment\d+$')
+# Units (TFT8_Sylas, TFT_TrainingDummy) and traits (Set8_Civilian) levels
+LEVEL_COLUMN = re.compile(r'^(TFT|Set)\d*[a-z]?_')
+
+# Placement 1-8, unit tier × rarity and trait level (tier_current / tier_total * 12) fit a byte.
+PLACEMENT_DTYPE = np.uint8
+LEVEL_DTYPE = np.uint8
+
+
+def column_kind(name: str) -> Optional[str]:
+    """Kind of a match frame column, None for the others (_id, match_id, features)."""
+    if name == 'placement':
+        return PLACEMENT
+    if ITEM_COLUMN.search(name):
+        return ITEM
+    if AUGMENT_COLUMN.match(name):
+        return AUGMENT
+    if LEVEL_COLUMN.match(name):
+        return LEVEL
+    return None
+
+
+def apply_schema(df: pd.DataFrame, truncate_levels: bool = False) -> pd.DataFrame:
+    """Compact dtypes of a wide match frame, after impute.
+
+    Items and augments become categories, their strings are stored once per
+    column with small int codes. Placement and levels become uint8, a trait
+    level that is not integral (12 / 5) stays float64 unless levels are
+    truncated. Other columns are kept.
+
+    Args:
+        df (DataFrame): Flattened matches, from the flattener or the db.
+        truncate_levels (bool, optional): Levels to ints like astype(int), for features. Defaults to False.
+
+    Returns:
+        DataFrame: New frame with the columns and index of df.
+    """
+    kinds: dict = {name: column_kind(name) for name in df.columns}
+    texts: list = [name for name in df.columns if kinds[name] in (ITEM, AUGMENT)
+                   and df[name].dtype == object]
+    numbers: list = [name for name in df.select_dtypes(include='number').columns
+                     if kinds[name] in (PLACEMENT, LEVEL)]
+    if not texts and not numbers:
+        return df.copy()
+
+    parts: list = [df.drop(columns=texts + numbers)]
+    if texts:
+        # Sorted categories holding the values of the column only, codes stay int8
+        parts.append(pd.DataFrame({name: df[name].astype('category') for name in texts}, index=df.index))
+    if numbers:
+        values: np.ndarray = df[numbers].to_numpy(dtype=np.float64)
+        values[np.isnan(values)] = 0
+        if truncate_levels:
+            values = np.trunc(values)
+        integral = (values == np.trunc(values)).all(axis=0)
+        columns = pd.Index(numbers)
+        if integral.any():
+            parts.append(pd.DataFrame(values[:, integral].astype(LEVEL_DTYPE), index=df.index,
+                                      columns=columns[integral], copy=False))
+        if not integral.all():
+            parts.append(pd.DataFrame(values[:, ~integral], index=df.index, columns=columns[~integral], copy=False))
+    return pd.concat(parts, axis=1, copy=False)[df.columns]
+
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# coding: utf-8
+import json
+import os.path
+import shutil
+from datetime import datetime
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+from .schema import column_kind
+
+# Snapshot file formats, Arrow IPC files are uncompressed and memory-mapped as is.
+PARQUET, ARROW = 'parquet', 'arrow'
+# Rows per file of a snapshot directory
+ROWS_PER_FILE: int = 100000
+# Schema metadata key of the snapshot description
+METADATA_KEY: bytes = b'tft'
+
+
+def write_snapshot(df: pd.DataFrame, name: str, directory: str, file_format: str = PARQUET,
+                   rows_per_file: int = ROWS_PER_FILE, metadata: dict = {}) -> str:
+    """Write a flattened matches dataset as a directory of Parquet or Arrow IPC files.
+
+    The files of `{directory}/{name}` hold `rows_per_file` rows each with the
+    pandas dtypes (categories, uint8) and a `tft` schema metadata: name, rows,
+    created time, column kinds and `metadata`. They are written aside then
+    swapped in place of the previous snapshot.
+
+    Args:
+        df (DataFrame): Dataset, like a `{server}_{league}_{release}_{patch}_matches` collection.
+        name (str): Dataset name, the snapshot directory.
+        directory (str): Snapshots directory.
+        file_format (str, optional): 'parquet' or 'arrow'. Defaults to 'parquet'.
+        rows_per_file (int, optional): Rows per file. Defaults to ROWS_PER_FILE.
+        metadata (dict, optional): More description, like server or patch. Defaults to {}.
+
+    Returns:
+        str: Snapshot path.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    description: dict = {'name': name, 'rows': len(df), 'format': file_format,
+                         'created': datetime.now().isoformat(timespec='seconds'),
+                         'kinds': {column: column_kind(column) for column in df.columns if column_kind(column)},
+                         **metadata}
+    table = table.replace_schema_metadata({**table.schema.metadata, METADATA_KEY: json.dumps(description)})
+
+    path = os.path.join(directory, name)
+    staging, previous = f'{path}.staging', f'{path}.previous'
+    for stale in [staging, previous]:
+        shutil.rmtree(stale, ignore_errors=True)
+    os.makedirs(staging)
+    # At least one file, an empty snapshot keeps the schema
+    for part, start in enumerate(range(0, max(len(df), 1), rows_per_file)):
+        chunk = table.slice(start, rows_per_file)
+        file = os.path.join(staging, f'part-{part:05d}.{file_format}')
+        if file_format == PARQUET:
+            pq.write_table(chunk, file)
+        else:
+            with pa.ipc.new_file(file, chunk.schema) as writer:
+                writer.write_table(chunk)
+
+    if os.path.exists(path):
+        os.replace(path, previous)
+    os.replace(staging, path)
+    shutil.rmtree(previous, ignore_errors=True)
+    return path
+
+
+def _dataset(name: str, directory: str) -> ds.Dataset:
+    path = os.path.join(directory, name)
+    file_format = ARROW if any(file.endswith(f'.{ARROW}') for file in os.listdir(path)) else PARQUET
+    return ds.dataset(path, format='ipc' if file_format == ARROW else 'parquet',
+                      filesystem=fs.LocalFileSystem(use_mmap=True))
+
+
+def read_snapshot(name: str, directory: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Dataset of a snapshot with its pandas dtypes, files are memory-mapped.
+
+    Args:
+        name (str): Dataset name.
+        directory (str): Snapshots directory.
+        columns (List[str], optional): Columns to read, all when None. Defaults to None.
+
+    Returns:
+        DataFrame: Dataset rows, in the written order.
+    """
+    return _dataset(name, directory).to_table(columns=columns).to_pandas()
+
+
+def read_snapshot_metadata(name: str, directory: str) -> dict:
+    """Description written with a snapshot, without reading its rows."""
+    return json.loads(_dataset(name, directory).schema.metadata[METADATA_KEY])
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# coding: utf-8
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+
+class Stage(NamedTuple):
+    """Step of a DAG, `func(*results of inputs, **kwargs)`.
+
+    func and its arguments are pickled to run on a process pool, so func is
+    a module level function. Each stage gets its own copy of its inputs there,
+    `select` maps an input to a function run on the loop beforehand, such as
+    a columns projection, so that only the part func reads is pickled.
+    """
+    name: str
+    func: Callable
+    inputs: Tuple[str, ...] = ()
+    kwargs: dict = {}
+    select: Dict[str, Callable[[Any], Any]] = {}
+
+
+def check_stages(stages: List[Stage], inputs: Dict[str, Any] = {}) -> None:
+    """Raise a ValueError unless every stage input is a given input or an earlier stage.
+
+    Stages are thus listed in a topological order, and the DAG has no cycle.
+    """
+    names = set(inputs)
+    for stage in stages:
+        if stage.name in names:
+            raise ValueError(f"Stage {stage.name} defined twice")
+        unknown = [name for name in stage.inputs if name not in names]
+        if unknown:
+            raise ValueError(f"Stage {stage.name} inputs {unknown} are not earlier stages")
+        names.add(stage.name)
+
+
+async def run_stages(stages: List[Stage], executor: Executor = None, inputs: Dict[str, Any] = {}) -> Dict[str, Any]:
+    """Run stages on an executor, each one as soon as its inputs are done.
+
+    Independent stages run at the same time, the loop is free meanwhile. On a
+    process pool the inputs of every running stage are pickled, so memory grows
+    with the executor workers: select what a stage reads, or use fewer workers.
+
+    Args:
+        stages (List[Stage]): Stages, inputs before the stages using them.
+        executor (Executor, optional): Process or thread pool, the loop default one when None. Defaults to None.
+        inputs (Dict[str, Any], optional): Values available to stages as inputs. Defaults to {}.
+
+    Raises:
+        ValueError: Stages are not a DAG over inputs.
+        Exception: The first error of a stage, the stages using it do not run.
+
+    Returns:
+        Dict[str, Any]: Result of each stage.
+    """
+    check_stages(stages, inputs)
+    loop = asyncio.get_running_loop()
+    futures: Dict[str, asyncio.Future] = {}
+    for name, value in inputs.items():
+        futures[name] = loop.create_future()
+        futures[name].set_result(value)
+
+    async def run(stage: Stage) -> Any:
+        args = [await futures[name] for name in stage.inputs]
+        args = [stage.select[name](arg) if name in stage.select else arg
+                for name, arg in zip(stage.inputs, args)]
+        start = time.perf_counter()
+        result = await loop.run_in_executor(executor, partial(stage.func, *args, **stage.kwargs))
+        logging.info(f"Stage {stage.name} done in {time.perf_counter() - start:.2f}s")
+        return result
+
+    for stage in stages:
+        futures[stage.name] = asyncio.ensure_future(run(stage))
+    tasks = [futures[stage.name] for stage in stages]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # Stages waiting on a failed one
+        for task in tasks:
+            task.cancel()
+    return {stage.name: futures[stage.name].result() for stage in stages}
@@ -0,0 +1,50 @@
+import asyncio
+
+import aiohttp
+import pytest
+from pantheon.utils import exceptions as exc
+
+from . import client
+from .client import TFTPantheon
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+class FakeResponse:
+    status = 200
+    headers = {}
+
+    async def text(self):
+        return '["NA1_1"]'
+
+
+class FlakySession:
+    """Refuses the first connections, then answers."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.requests = 0
+
+    async def request(self, method, url, **kwargs):
+        self.requests += 1
+        if self.requests <= self.failures:
+            raise aiohttp.ClientConnectionError('refused')
+        return FakeResponse()
+
+
+@pytest.mark.asyncio
+async def test_failed_requests_give_their_rate_limit_token_back(monkeypatch):
+    # More failures than the 20 requests per second of the app limit
+    session = FlakySession(failures=25)
+    monkeypatch.setattr(client, 'get_session', lambda: session)
+    panth = TFTPantheon('na1', 'key')
+
+    for _ in range(25):
+        with pytest.raises(exc.Timeout):
+            await panth.get_tft_matchlist('puuid')
+    # Pending requests left by the failures would block every later token
+    limiters = panth._rl.on(panth._region)
+    assert all(limiter.currentlyPending + limiter.previouslyPending == 0
+               for limiter in limiters.application + limiters.methods['get_tft_matchlist'])
+    assert await asyncio.wait_for(panth.get_tft_matchlist('puuid'), 5) == ['NA1_1']
+    assert session.requests == 26
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from .clustering import JaccardDBSCAN, MinHashLSH, get_cluster_engine, unique_compositions, unit_matrix
+
+COMPS = [[0, 1, 2, 3, 4, 5, 6, 7], [10, 11, 12, 13, 14, 15, 16, 17], [20, 21, 22, 23, 24, 25, 26, 27]]
+
+
+def boards(n_per_comp=60, n_units=70, seed=0):
+    """Boards of 3 comps, 1 unit of 2 boards out of 3 swapped for a random one."""
+    rng = np.random.default_rng(seed)
+    levels = np.zeros((3 * n_per_comp, n_units), dtype=np.uint8)
+    comps = np.repeat(np.arange(3), n_per_comp)
+    for row, comp in enumerate(comps):
+        units = list(COMPS[comp])
+        if row % 3:
+            units[rng.integers(8)] = 30 + rng.integers(n_units - 30)
+        levels[row, units] = rng.integers(1, 4, len(units))
+    return levels, comps
+
+
+def same_clusters(labels, comps):
+    # Each comp is one cluster of its own
+    return all(len(set(labels[comps == comp])) == 1 and labels[comps == comp][0] >= 0 for comp in range(3)) and \
+        len({labels[comps == comp][0] for comp in range(3)}) == 3
+
+
+def test_binary_engines_find_the_comps():
+    levels, comps = boards()
+    X = unit_matrix(levels)
+    assert X.dtype == bool and X.nnz == (levels > 0).sum()
+
+    compositions, inverse, weights = unique_compositions(X)
+    # Unswapped boards of a comp are one composition
+    assert weights.sum() == len(levels) and inverse[0] == inverse[3] == inverse[6] != inverse[60]
+
+    for engine, params in [('minibatch_kmodes', {'n_clusters': 3, 'batch_size': 16}),
+                           ('jaccard_dbscan', {'eps': 0.25, 'min_samples': 5})]:
+        model, binary = get_cluster_engine(engine, **params)
+        assert binary and same_clusters(model.fit_predict(X), comps), engine
+
+    # Each comp bucketed apart from the other ones
+    labels = MinHashLSH(min_size=2).fit_predict(X)
+    assert all(not set(labels[comps == comp]) & set(labels[comps != comp]) - {-1} for comp in range(3))
+    # Only the 20 unswapped boards of a comp are alike, as many as min_samples
+    assert JaccardDBSCAN(eps=0.1, min_samples=20).fit_predict(X).tolist().count(-1) == 2 * len(levels) // 3
+
+
+def test_engines_registry():
+    model, binary = get_cluster_engine('dbscan', eps=0.5)
+    assert not binary and model.steps[-1][1].eps == 0.5
+    with pytest.raises(ValueError, match='Unknown clustering engine'):
+        get_cluster_engine('spectral')
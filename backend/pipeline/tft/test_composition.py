@@ -0,0 +1,31 @@
+import numpy as np
+
+from .composition import (composition_bits, composition_labels, group_compositions, has_unit, jaccard_similarity,
+                          popcount)
+
+
+def test_composition_bits_group_and_label():
+    units = [f'TFT8_Unit{index}' for index in range(70)]
+    levels = np.zeros((4, 70), dtype=np.uint8)
+    levels[0, [0, 3, 65]] = [1, 2, 3]
+    levels[1, [0, 3, 65]] = [3, 1, 1]  # Same composition, other levels
+    levels[2, [3, 69]] = 2
+
+    bits = composition_bits(levels)
+    assert bits.shape == (4, 2) and bits.dtype == np.uint64
+    assert popcount(bits).tolist() == [3, 3, 2, 0]
+    assert has_unit(bits, 65).tolist() == [True, True, False, False]
+    assert has_unit(bits, 3).tolist() == [True, True, True, False]
+
+    comps, inverse = group_compositions(bits)
+    assert len(comps) == 3 and inverse[0] == inverse[1] and len(set(inverse.tolist())) == 3
+    assert composition_labels(bits, units) == ['TFT8_Unit0, TFT8_Unit3, TFT8_Unit65',
+                                               'TFT8_Unit0, TFT8_Unit3, TFT8_Unit65',
+                                               'TFT8_Unit3, TFT8_Unit69', '']
+    assert composition_labels(bits[2:3], units, sep=',') == ['TFT8_Unit3,TFT8_Unit69']
+
+    similarity = jaccard_similarity(bits[:, None], bits[None])
+    assert similarity.shape == (4, 4)
+    # 1 shared unit out of 4
+    assert similarity[0, 2] == 0.25 and similarity[0, 1] == 1.0
+    assert similarity[0, 3] == 0.0 and similarity[3, 3] == 1.0
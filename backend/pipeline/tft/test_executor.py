@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+from pantheon.utils import exceptions as exc
+
+from .executor import CircuitBreaker, CircuitOpenError, RequestExecutor
+from .rate_limiter import RateLimiter
+from .test_rate_limiter import FakeClock
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+def make_executor(clock, **kwargs):
+    limiter = RateLimiter(app_limits=[(20, 1)], method_limits={},
+                          clock=clock, sleep=clock.sleep)
+    return RequestExecutor(limiter, sleep=clock.sleep, clock=clock, **kwargs)
+
+
+class FlakyEndpoint:
+    """Fails with the given errors, then answers."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def __call__(self, match_id):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {'match_id': match_id}
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_honored():
+    clock = FakeClock()
+    executor = make_executor(clock)
+    endpoint = FlakyEndpoint(exc.RateLimit({'Retry-After': '7'}))
+
+    assert await executor.call('na1', 'get_tft_match', endpoint, 'NA1_1') == {'match_id': 'NA1_1'}
+    assert clock.now >= 7
+    assert executor.counters['rate_limited'] == 1
+    assert executor.counters['retried'] == 1
+
+
+@pytest.mark.asyncio
+async def test_server_errors_are_retried_then_dropped():
+    clock = FakeClock()
+    executor = make_executor(clock, max_retries=2)
+    endpoint = FlakyEndpoint(*[exc.ServerError() for _ in range(3)])
+
+    with pytest.raises(exc.ServerError):
+        await executor.call('na1', 'get_tft_match', endpoint, 'NA1_1')
+    assert endpoint.calls == 3
+    assert executor.counters['retried'] == 2
+    assert executor.counters['dropped'] == 1
+
+
+@pytest.mark.asyncio
+async def test_not_found_is_not_retried():
+    clock = FakeClock()
+    executor = make_executor(clock)
+    endpoint = FlakyEndpoint(exc.NotFound())
+
+    with pytest.raises(exc.NotFound):
+        await executor.call('na1', 'get_tft_match', endpoint, 'NA1_1')
+    assert endpoint.calls == 1
+    assert executor.counters['failed'] == 1
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_per_endpoint():
+    clock = FakeClock()
+    executor = make_executor(clock, max_retries=0,
+                             breaker_options={'min_calls': 3, 'cooldown': 30})
+    failing = FlakyEndpoint(*[exc.ServerError() for _ in range(3)])
+
+    for _ in range(3):
+        with pytest.raises(exc.ServerError):
+            await executor.call('na1', 'get_tft_match', failing, 'NA1_1')
+    with pytest.raises(CircuitOpenError):
+        await executor.call('na1', 'get_tft_match', failing, 'NA1_1')
+    assert failing.calls == 3
+    # Other endpoints are unaffected
+    assert await executor.call('na1', 'get_tft_matchlist', FlakyEndpoint(), 'p') == {'match_id': 'p'}
+
+    # Half-open after the cooldown, a success closes it again
+    clock.now += 30
+    assert await executor.call('na1', 'get_tft_match', failing, 'NA1_1') == {'match_id': 'NA1_1'}
+    assert executor.breaker('na1', 'get_tft_match').state == 'closed'
+
+
+@pytest.mark.asyncio
+async def test_rate_limits_do_not_open_the_circuit():
+    clock = FakeClock()
+    executor = make_executor(clock, max_retries=6, breaker_options={'min_calls': 3})
+    endpoint = FlakyEndpoint(*[exc.RateLimit({'Retry-After': '1'}) for _ in range(5)])
+
+    assert await executor.call('na1', 'get_tft_match', endpoint, 'NA1_1') == {'match_id': 'NA1_1'}
+    assert executor.counters['rate_limited'] == 5 and executor.counters['dropped'] == 0
+    assert executor.breaker('na1', 'get_tft_match').state == 'closed'
+
+
+def test_breaker_trial_failure_reopens():
+    clock = FakeClock()
+    breaker = CircuitBreaker(min_calls=2, cooldown=10, clock=clock)
+    breaker.record(False)
+    breaker.record(False)
+    assert breaker.state == 'open'
+    clock.now += 10
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record(False)
+    assert breaker.state == 'open'
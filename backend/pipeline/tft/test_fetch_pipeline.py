@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from .fetch_pipeline import FetchPipeline, map_bounded
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+async def fetch_document(id):
+    await asyncio.sleep(0)
+    return {'_id': id}
+
+
+class BatchWriter:
+    """Records the batches written."""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, documents):
+        self.batches.append([document['_id'] for document in documents])
+
+
+@pytest.mark.asyncio
+async def test_map_bounded_keeps_order_and_bound():
+    running = []
+    peak = []
+
+    async def slow_square(value):
+        running.append(value)
+        peak.append(len(running))
+        # Later items finish first
+        await asyncio.sleep(0.01 * (5 - value))
+        running.remove(value)
+        return value * value
+
+    assert await map_bounded(slow_square, list(range(5)), workers=2) == [0, 1, 4, 9, 16]
+    assert max(peak) == 2
+    assert await map_bounded(slow_square, []) == []
+
+
+@pytest.mark.asyncio
+async def test_put_waits_once_the_queue_is_full():
+    released = asyncio.Event()
+
+    async def held_fetch(id):
+        await released.wait()
+        return {'_id': id}
+
+    writer = BatchWriter()
+    pipeline = FetchPipeline(held_fetch, writer, workers=1, batch_size=10, queue_size=2).start()
+    # One id held by the worker, two queued
+    for id in range(3):
+        await asyncio.wait_for(pipeline.put(id), 1)
+    await asyncio.sleep(0.01)
+    blocked = asyncio.create_task(pipeline.put(3))
+    await asyncio.sleep(0.05)
+    assert not blocked.done()
+
+    released.set()
+    await asyncio.wait_for(blocked, 1)
+    assert await pipeline.join() == 4
+    assert writer.batches == [[0, 1, 2, 3]]
+
+
+@pytest.mark.asyncio
+async def test_documents_are_written_in_batches():
+    writer = BatchWriter()
+    pipeline = FetchPipeline(fetch_document, writer, workers=2, batch_size=3).start()
+    for id in range(7):
+        await pipeline.put(id)
+    assert await pipeline.join() == 7
+    assert [len(batch) for batch in writer.batches] == [3, 3, 1]
+    assert sorted(sum(writer.batches, [])) == list(range(7))
+
+
+@pytest.mark.asyncio
+async def test_flush_interval_writes_a_partial_batch():
+    writer = BatchWriter()
+    pipeline = FetchPipeline(fetch_document, writer, workers=2, batch_size=10, flush_interval=0.05).start()
+    for id in range(2):
+        await pipeline.put(id)
+    await asyncio.sleep(0.3)
+    # Written before the pipeline is drained
+    assert writer.batches == [[0, 1]] and pipeline.written == 2
+
+    await pipeline.put(2)
+    assert await pipeline.join() == 3
+    assert writer.batches == [[0, 1], [2]]
+
+
+@pytest.mark.asyncio
+async def test_failed_and_missing_documents_are_counted():
+    async def odd_fails(id):
+        if id % 2:
+            raise ValueError(f'{id} failed')
+        # Nothing to write for 0
+        return {'_id': id} if id else None
+
+    writer = BatchWriter()
+    pipeline = FetchPipeline(odd_fails, writer, workers=3, batch_size=2).start()
+    for id in range(6):
+        await pipeline.put(id)
+    assert await pipeline.join() == 2
+    assert (pipeline.fetched, pipeline.failed) == (2, 3)
+    assert sorted(pipeline.take_failed()) == [1, 3, 5]
+    assert pipeline.take_failed() == []
+
+
+@pytest.mark.asyncio
+async def test_failed_writes_give_their_ids_back():
+    def failing_write(documents):
+        raise IOError('disk full')
+
+    pipeline = FetchPipeline(fetch_document, failing_write, workers=2, batch_size=2).start()
+    for id in range(3):
+        await pipeline.put(id)
+    assert await pipeline.join() == 0
+    assert (pipeline.fetched, pipeline.failed) == (3, 3)
+    assert sorted(pipeline.take_failed()) == [0, 1, 2]
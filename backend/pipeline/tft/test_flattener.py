@@ -0,0 +1,44 @@
+import numpy as np
+
+from .flattener import MatchFlattener
+
+
+def make_participant(puuid, placement, augments, traits, units):
+    return {'puuid': puuid, 'placement': placement, 'augments': augments,
+            'traits': [{'name': name, 'tier_current': current, 'tier_total': 3} for name, current in traits],
+            'units': [{'character_id': unit, 'tier': tier, 'rarity': rarity, 'itemNames': items}
+                      for unit, tier, rarity, items in units]}
+
+
+MATCHES = [
+    {'metadata': {'match_id': 'NA1_1'}, 'info': {'participants': [
+        make_participant('a', 1, ['TFT9_Augment_A'], [('Set8_Civilian', 3)],
+                         [('TFT8_Sylas', 2, 1, ['TFT_Item_InfinityEdge', 'TFT_Item_Bloodthirster']),
+                          # A second copy overwrites the first one's level and item0
+                          ('TFT8_Sylas', 1, 1, ['TFT_Item_GuinsoosRageblade'])]),
+        make_participant('b', 2, [], [], [('TFT9_New', 3, 4, [])]),
+    ]}},
+    {'metadata': {'match_id': 'NA1_2'}, 'info': {'participants': [
+        make_participant('c', 8, ['TFT9_Augment_B', 'TFT9_Augment_C'], [('Set9_Unknown', 1)],
+                         [('TFT8_Sylas', 3, 1, [])]),
+    ]}},
+]
+
+
+def test_flatten_matches_process_matches_rows():
+    flattener = MatchFlattener(units=['TFT8_Sylas', 'TFT8_Unused'], traits=['Set8_Civilian'], batch_size=1)
+    df = flattener.flatten(MATCHES)
+
+    assert df['_id'].tolist() == ['NA1_1-a', 'NA1_1-b', 'NA1_2-c']
+    assert df['match_id'].tolist() == ['NA1_1', 'NA1_1', 'NA1_2']
+    assert df['placement'].dtype == np.int64 and df['placement'].tolist() == [1, 2, 8]
+    # Columns without any value are not returned, unknown ones are added
+    assert 'TFT8_Unused' not in df and 'TFT8_Sylas_item2' not in df
+    assert df['TFT8_Sylas'].tolist()[::2] == [1.0, 3.0] and np.isnan(df['TFT8_Sylas'][1])
+    assert df['TFT8_Sylas_item0'].tolist()[0] == 'GuinsoosRageblade'
+    assert df['TFT8_Sylas_item1'].tolist()[0] == 'Bloodthirster'
+    assert df['TFT9_New'].tolist()[1] == 12
+    assert df['Set8_Civilian'].tolist()[0] == 12.0
+    assert df['Set9_Unknown'].tolist()[2] == 4.0
+    assert df['augment0'].tolist()[::2] == ['TFT9_Augment_A', 'TFT9_Augment_B']
+    assert df['augment1'].tolist()[2] == 'TFT9_Augment_C'
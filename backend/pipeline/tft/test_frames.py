@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+from .frames import FrameBuilder, impute, load_frame_db
+
+
+def test_impute_fills_blocks_and_downcasts_levels():
+    df = pd.DataFrame({
+        'placement': [1, 8, 4],
+        'match_id': ['NA1_1', 'NA1_1', None],
+        'TFT8_Sylas': [3.0, np.nan, 18.0],
+        'TFT8_Sylas_item0': ['InfinityEdge', np.nan, np.nan],
+        'Set8_Civilian': [4.0, 2.4, np.nan],
+        'game_datetime': pd.to_datetime(['2022-12-07', None, '2022-12-08']),
+        'ranked': [True, False, True],
+    }, index=[10, 11, 12])
+    out = impute(df)
+
+    assert out.columns.tolist() == df.columns.tolist() and out.index.tolist() == [10, 11, 12]
+    assert out['placement'].dtype == np.int8 and out['placement'].tolist() == [1, 8, 4]
+    assert out['TFT8_Sylas'].dtype == np.int8 and out['TFT8_Sylas'].tolist() == [3, 0, 18]
+    # Not integral, stays a float
+    assert out['Set8_Civilian'].dtype == np.float64 and out['Set8_Civilian'].tolist() == [4.0, 2.4, 0.0]
+    assert out['TFT8_Sylas_item0'].tolist() == ['InfinityEdge', 'None', 'None']
+    assert out['match_id'].tolist() == ['NA1_1', 'NA1_1', 'None']
+    assert out['game_datetime'][11] == pd.Timestamp('2020-01-01')
+    assert out['ranked'].dtype == bool
+    # The input is left as is
+    assert df['TFT8_Sylas'].isna().sum() == 1
+
+    kept = impute(df, downcast=False)
+    assert kept['TFT8_Sylas'].dtype == np.float64 and kept['placement'].dtype == np.int64
+
+
+DOCUMENTS = [
+    {'_id': 'NA1_1-a', 'placement': 1, 'augment0': 'TFT9_Augment_A', 'TFT8_Sylas': 3.0, 'ranked': True},
+    {'_id': 'NA1_1-b', 'placement': 2, 'augment0': 'TFT9_Augment_A', 'TFT8_Sylas': 1.0, 'ranked': False},
+    # Batch without augment0, ranked and with a new column
+    {'_id': 'NA1_2-c', 'placement': 8, 'TFT8_Sylas': 2, 'TFT8_Sylas_item0': 'InfinityEdge'},
+    {'_id': 'NA1_2-d', 'placement': 3.5, 'augment0': 'TFT9_Augment_B', 'TFT8_Sylas': 6, 'ranked': True},
+]
+
+
+class FakeCollection:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def count_documents(self, query):
+        return len(self.documents)
+
+    def find(self, query, projection=None, batch_size=0):
+        for document in self.documents:
+            if projection:
+                document = {key: value for key, value in document.items() if projection.get(key, 0)}
+            # New strings, like decoded BSON
+            yield {key: value[:1] + value[1:] if isinstance(value, str) else value
+                   for key, value in document.items()}
+
+
+def test_frame_builder_matches_dataframe_of_documents():
+    # Sized too small, it grows
+    builder = FrameBuilder(n_rows=1)
+    for start in range(0, len(DOCUMENTS), 2):
+        builder.append(DOCUMENTS[start:start + 2])
+    pd.testing.assert_frame_equal(builder.frame(), pd.DataFrame(DOCUMENTS))
+
+    df = load_frame_db(FakeCollection(DOCUMENTS), batch_size=3)
+    pd.testing.assert_frame_equal(df, pd.DataFrame(DOCUMENTS))
+    # Repeated strings are one object
+    assert df['augment0'][0] is df['augment0'][1]
+
+    projected = load_frame_db(FakeCollection(DOCUMENTS), columns=['placement', 'augment0', 'unknown'])
+    assert projected.columns.tolist() == ['placement', 'augment0', 'unknown']
+    assert projected['placement'].tolist() == [1, 2, 8, 3.5] and projected['unknown'].isna().all()
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from .ranking import rank_placements, unit_items_ranking
+
+
+def test_unit_items_ranking_all_units_at_once():
+    df = pd.DataFrame({
+        'placement': [1, 3, 8, 2],
+        'TFT8_Sylas_item0': ['InfinityEdge', 'Bloodthirster', 'None', 'Bloodthirster'],
+        'TFT8_Sylas_item1': ['Bloodthirster', 'InfinityEdge', 'None', 'None'],
+        'TFT8_Sylas_item2': ['None', 'None', 'None', 'None'],
+        # Two item columns only
+        'TFT8_Vi_item0': ['Zeke', 'Zeke', 'None', 'Zeke'],
+        'TFT8_Vi_item1': ['None', 'None', 'None', 'Warmogs'],
+    }).astype({'TFT8_Vi_item0': 'category'})
+    ranking = unit_items_ranking(df, ['TFT8_Vi', 'TFT8_Sylas'])
+
+    assert ranking.columns.tolist() == ['unit', 'items', 'value_count', 'average_placement',
+                                        'ci_low', 'ci_high', 'top4_rate']
+    assert ranking[['unit', 'items']].values.tolist() == [
+        ['TFT8_Vi', 'None, Zeke'],
+        ['TFT8_Vi', 'Warmogs, Zeke'],
+        ['TFT8_Vi', 'None, None'],
+        ['TFT8_Sylas', 'Bloodthirster, InfinityEdge, None'],
+        # Tie of average placement, by items
+        ['TFT8_Sylas', 'Bloodthirster, None, None'],
+        ['TFT8_Sylas', 'None, None, None'],
+    ]
+    assert ranking['value_count'].tolist() == [2, 1, 1, 2, 1, 1]
+    assert ranking['average_placement'].tolist() == [2.0, 2.0, 8.0, 2.0, 2.0, 8.0]
+    assert ranking['top4_rate'].tolist() == [1.0, 1.0, 0.0, 1.0, 1.0, 0.0]
+
+    frequent = unit_items_ranking(df, ['TFT8_Vi', 'TFT8_Sylas'], min_count=2)
+    assert frequent['items'].tolist() == ['None, Zeke', 'Bloodthirster, InfinityEdge, None']
+
+
+def test_rank_placements():
+    df = pd.DataFrame({'placement': [1, 3, 8, 6, 2, 5, 4],
+                       'augment0': ['B', 'B', 'A', 'A', 'C', 'A', None]}).astype({'augment0': 'category'})
+    ranking = rank_placements(df, 'augment0', count_name='Value_Count')
+
+    # Rows without augment are not ranked
+    assert ranking.columns.tolist() == ['augment0', 'Value_Count', 'average_placement', 'ci_low', 'ci_high',
+                                        'top4_rate']
+    assert ranking['augment0'].tolist() == ['B', 'C', 'A']
+    assert ranking['Value_Count'].tolist() == [2, 1, 3]
+    assert ranking['average_placement'].tolist() == [2.0, 2.0, 6.33]
+    # std 1.41 of B, sample std 1.53 of A, none for one placement
+    assert ranking['ci_low'].tolist()[0] == 0.04 and ranking['ci_high'].tolist()[0] == 3.96
+    assert ranking['ci_high'].tolist()[2] == round(19 / 3 + 1.96 * np.sqrt(7 / 3 / 3), 2)
+    assert np.isnan(ranking['ci_low'].tolist()[1])
+    assert ranking['top4_rate'].tolist() == [1.0, 1.0, 0.0]
+
+    assert rank_placements(df, 'augment0', min_count=2)['augment0'].tolist() == ['B', 'A']
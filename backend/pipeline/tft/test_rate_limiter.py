@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from .rate_limiter import RateLimiter, routing_value
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+class FakeClock:
+    """Virtual time, so minutes of rate limiting run instantly."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+        await asyncio.sleep(0)
+
+
+class FakeRiotAPI:
+    """Local stand-in for the Riot API enforcing its fixed window limits.
+
+    A window starts with the first call after the previous one expired, every
+    call over the limit inside a window is answered with a 429.
+    """
+
+    def __init__(self, clock, app_limits, method_limits):
+        self.clock = clock
+        self.app_limits = app_limits
+        self.method_limits = method_limits
+        self.windows = {}
+        self.calls = 0
+        self.rejected = 0
+
+    def _count(self, key, limit, period):
+        now = self.clock()
+        start, count = self.windows.get(key, (None, 0))
+        if start is None or start + period <= now:
+            start, count = now, 0
+        self.windows[key] = (start, count + 1)
+        return count + 1 <= limit
+
+    async def call(self, server, method):
+        routing = routing_value(server, method)
+        allowed = all([self._count((routing, None, period), limit, period)
+                       for limit, period in self.app_limits] +
+                      [self._count((routing, method, period), limit, period)
+                       for limit, period in self.method_limits[method]])
+        self.calls += 1
+        if not allowed:
+            self.rejected += 1
+        return allowed
+
+
+def make_limiter(clock, app_limits, method_limits):
+    return RateLimiter(app_limits=app_limits, method_limits=method_limits,
+                       clock=clock, sleep=clock.sleep)
+
+
+def test_routing_value():
+    assert routing_value('na1', 'get_tft_match') == 'americas'
+    assert routing_value('oc1', 'get_tft_matchlist') == 'americas'
+    assert routing_value('euw1', 'get_tft_match') == 'europe'
+    assert routing_value('kr', 'get_tft_summoner') == 'kr'
+
+
+@pytest.mark.asyncio
+async def test_shared_budget_has_no_429():
+    app_limits = [(20, 1), (100, 120)]
+    method_limits = {'get_tft_match': [(200, 10)],
+                     'get_tft_matchlist': [(400, 10)]}
+    clock = FakeClock()
+    api = FakeRiotAPI(clock, app_limits, method_limits)
+    limiter = make_limiter(clock, app_limits, method_limits)
+
+    async def fetch(server, method):
+        await limiter.acquire(server, method)
+        return await api.call(server, method)
+
+    # na1 and oc1 share the americas cluster, as two leagues would share a server.
+    tasks = [fetch(server, method)
+             for server in ['na1', 'oc1']
+             for method in ['get_tft_match', 'get_tft_matchlist']
+             for _ in range(60)]
+    results = await asyncio.gather(*tasks)
+
+    assert all(results)
+    assert api.rejected == 0
+    assert api.calls == 240
+    # 240 calls over a 100 per 120s budget need exactly two full refills.
+    assert 240 <= clock.now < 250
+
+
+@pytest.mark.asyncio
+async def test_penalize_holds_back_routing_value():
+    clock = FakeClock()
+    limiter = make_limiter(clock, [(20, 1)], {'get_tft_summoner': []})
+
+    limiter.penalize('na1', 'get_tft_summoner', retry_after=5)
+    await limiter.acquire('na1', 'get_tft_summoner')
+    assert clock.now >= 5
+
+    # Other platforms keep their own budget.
+    started = clock.now
+    await limiter.acquire('euw1', 'get_tft_summoner')
+    assert clock.now == started
@@ -0,0 +1,48 @@
+from .scheduler import PollScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_active_summoners_are_polled_more_often():
+    clock = FakeClock()
+    scheduler = PollScheduler(min_interval=60, max_interval=3600, clock=clock)
+    scheduler.schedule('active')
+    scheduler.schedule('idle')
+    polls = {'active': 0, 'idle': 0}
+
+    while clock.now < 6 * 3600:
+        for key in scheduler.pop_due():
+            polls[key] += 1
+            scheduler.done(key, new_games=1 if key == 'active' else 0)
+        clock.now += scheduler.next_due()
+
+    # The active one stays at min_interval, the idle one backs off to max_interval
+    assert polls['active'] >= 6 * 60
+    assert polls['idle'] <= 6 + 6
+    assert scheduler.next_due() <= 60
+
+
+def test_bump_and_remove():
+    clock = FakeClock()
+    scheduler = PollScheduler(min_interval=60, max_interval=3600, clock=clock)
+    for key in ['a', 'b', 'c']:
+        scheduler.schedule(key, delay=1000)
+    assert scheduler.pop_due() == []
+
+    scheduler.bump('b')
+    scheduler.remove('c')
+    assert scheduler.pop_due() == ['b']
+    assert len(scheduler) == 1 and 'c' not in scheduler
+
+    # A removed summoner polled meanwhile is not put back
+    clock.now = 1000
+    assert scheduler.pop_due() == ['a']
+    scheduler.remove('a')
+    scheduler.done('a', new_games=3)
+    assert scheduler.next_due() is None
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from .schema import ITEM, LEVEL, apply_schema, column_kind
+
+
+def test_apply_schema_compacts_match_frame():
+    df = pd.DataFrame({
+        'placement': [1, 8, 4],
+        'match_id': ['NA1_1', 'NA1_1', 'NA1_2'],
+        'augment0': ['TFT9_Augment_A', 'TFT9_Augment_B', 'TFT9_Augment_A'],
+        'TFT8_Sylas': [3.0, 0.0, 18.0],
+        'TFT8_Sylas_item0': ['InfinityEdge', 'None', 'InfinityEdge'],
+        'Set8_Civilian': [4.0, 0.0, 12.0],
+        'Set8_Threat': [2.4, 0.0, 4.8],
+    })
+    assert column_kind('TFT8_Sylas_item0') == ITEM and column_kind('Set8_Civilian') == LEVEL
+    out = apply_schema(df)
+
+    assert out.columns.tolist() == df.columns.tolist()
+    assert out['match_id'].dtype == object
+    assert out['TFT8_Sylas_item0'].dtype == 'category'
+    assert out['TFT8_Sylas_item0'].cat.categories.tolist() == ['InfinityEdge', 'None']
+    assert out['augment0'].tolist() == df['augment0'].tolist()
+    for name in ['placement', 'TFT8_Sylas', 'Set8_Civilian']:
+        assert out[name].dtype == np.uint8 and out[name].tolist() == df[name].tolist()
+    # Not integral, kept unless truncated
+    assert out['Set8_Threat'].tolist() == [2.4, 0.0, 4.8]
+    truncated = apply_schema(df, truncate_levels=True)
+    assert truncated['Set8_Threat'].dtype == np.uint8 and truncated['Set8_Threat'].tolist() == [2, 0, 4]
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from .schema import apply_schema
+from .snapshot import ARROW, PARQUET, read_snapshot, read_snapshot_metadata, write_snapshot
+
+
+@pytest.mark.parametrize('file_format', [PARQUET, ARROW])
+def test_snapshot_round_trip(tmp_path, file_format):
+    df = apply_schema(pd.DataFrame({
+        '_id': [f'NA1_{row}-a' for row in range(5)],
+        'placement': [1, 2, 3, 4, 5],
+        'augment0': ['A', 'B', 'A', 'C', 'A'],
+        'TFT8_Sylas': [3.0, 0.0, 2.0, 1.0, 6.0],
+        'TFT8_Sylas_item0': ['InfinityEdge', 'None', 'None', 'Bloodthirster', 'None'],
+    }))
+    write_snapshot(df.iloc[:1], 'na1_matches', str(tmp_path), file_format=file_format)
+    # Replaces the previous one
+    write_snapshot(df, 'na1_matches', str(tmp_path), file_format=file_format, rows_per_file=2,
+                   metadata={'patch': '2023-05-16'})
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['na1_matches']
+    assert len(list((tmp_path / 'na1_matches').iterdir())) == 3
+    pd.testing.assert_frame_equal(read_snapshot('na1_matches', str(tmp_path)), df)
+
+    projected = read_snapshot('na1_matches', str(tmp_path), columns=['placement', 'TFT8_Sylas_item0'])
+    assert projected.columns.tolist() == ['placement', 'TFT8_Sylas_item0']
+    assert projected['placement'].dtype == np.uint8 and projected['TFT8_Sylas_item0'].dtype == 'category'
+
+    metadata = read_snapshot_metadata('na1_matches', str(tmp_path))
+    assert metadata['rows'] == 5 and metadata['patch'] == '2023-05-16' and metadata['format'] == file_format
+    assert metadata['kinds']['TFT8_Sylas_item0'] == 'item' and '_id' not in metadata['kinds']
@@ -0,0 +1,48 @@
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from .stages import Stage, check_stages, run_stages
+
+
+def test_independent_stages_run_at_the_same_time():
+    # Both branches wait for each other, they deadlock if run one after the other
+    barrier = threading.Barrier(2, timeout=5)
+
+    def branch(values, offset):
+        barrier.wait()
+        return [value + offset for value in values]
+
+    stages = [
+        Stage('left', branch, ('values',), {'offset': 1}),
+        Stage('right', branch, ('values',), {'offset': 10}),
+        Stage('total', lambda left, right: sum(left) + sum(right), ('left', 'right')),
+    ]
+    with ThreadPoolExecutor(2) as executor:
+        results = asyncio.run(run_stages(stages, executor, {'values': [1, 2]}))
+    assert results == {'left': [2, 3], 'right': [11, 12], 'total': 28}
+
+
+def test_stages_on_a_process_pool():
+    stages = [Stage('low', min, ('values',)), Stage('high', max, ('values',)),
+              Stage('spread', divmod, ('high', 'low')),
+              # Selected on the loop, only the first values are pickled
+              Stage('head', sum, ('values',), select={'values': lambda values: values[:2]})]
+    with ProcessPoolExecutor(2) as executor:
+        results = asyncio.run(run_stages(stages, executor, {'values': [3, 9, 4]}))
+    assert results == {'low': 3, 'high': 9, 'spread': (3, 0), 'head': 12}
+
+
+def test_failed_stage_and_invalid_dag():
+    ran = []
+    stages = [Stage('fail', int, ('text',)), Stage('after', ran.append, ('fail',))]
+    with pytest.raises(ValueError):
+        asyncio.run(run_stages(stages, inputs={'text': 'not a number'}))
+    assert ran == []
+
+    with pytest.raises(ValueError, match='not earlier stages'):
+        check_stages([Stage('b', min, ('a',)), Stage('a', max, ('values',))], {'values': []})
+    with pytest.raises(ValueError, match='defined twice'):
+        check_stages([Stage('values', min)], {'values': []})
@@ -32,6 +32,8 @@ class Settings(BaseSettings):
     latest_release: str = get_latest_release()
     targetname: str = 'placement'
     max_count: int = 75
+    # Riot app rate limits [limit, seconds] per routing value of the API key.
+    app_rate_limits: list = [[20, 1], [100, 120]]
     # Regions (actually called platform) taken from https://developer.riotgames.com/docs/lol
     regions: dict = {
         "EUW1": {"code": "EUW1", "host": "euw1.api.riotgames.com"},
@@ -0,0 +1,69 @@
+from datetime import datetime
+
+from .logger import logging
+
+
+class ScrapeJournal:
+    """Checkpoints of a scrape run, kept in a `{server}_{league}_journal` collection.
+
+    Holds one `run` document with the run status, one document per summoner whose
+    matchlist was handled and one per match id queued but not yet stored. A run
+    killed midway leaves its status to 'running', so the next run can resume it.
+    """
+
+    RUN_ID = 'run'
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def begin(self, resume: bool = False) -> bool:
+        """Start a run, or continue the unfinished one when `resume`.
+
+        Pending matches are always kept, so matches that failed in any earlier
+        run are fetched again.
+
+        Returns:
+            bool: True if resuming an unfinished run.
+        """
+        run = self.collection.find_one({'_id': self.RUN_ID})
+        resuming = resume and run is not None and run.get('status') == 'running'
+        if resume and not resuming:
+            logging.warning('No unfinished run to resume, starting a new one.')
+        if not resuming:
+            self.collection.delete_many({'kind': 'summoner'})
+            self.collection.replace_one({'_id': self.RUN_ID},
+                                        {'status': 'running', 'league_loaded': False,
+                                         'started_at': datetime.utcnow()}, upsert=True)
+        return resuming
+
+    def end(self) -> None:
+        self.collection.update_one({'_id': self.RUN_ID},
+                                   {'$set': {'status': 'done', 'finished_at': datetime.utcnow()}})
+
+    def league_loaded(self) -> bool:
+        run = self.collection.find_one({'_id': self.RUN_ID}) or {}
+        return run.get('league_loaded', False)
+
+    def set_league_loaded(self) -> None:
+        self.collection.update_one({'_id': self.RUN_ID}, {'$set': {'league_loaded': True}})
+
+    def summoners_done(self) -> set:
+        return {doc['puuid'] for doc in self.collection.find({'kind': 'summoner'}, {'puuid': 1})}
+
+    def summoner_done(self, puuid: str) -> None:
+        self.collection.replace_one({'_id': f'summoner:{puuid}'},
+                                    {'kind': 'summoner', 'puuid': puuid}, upsert=True)
+
+    def matches_pending(self) -> list:
+        return [doc['match_id'] for doc in self.collection.find({'kind': 'match'}, {'match_id': 1})]
+
+    def add_pending_matches(self, matches_id: list) -> None:
+        try:
+            if matches_id:
+                self.collection.insert_many([{'_id': f'match:{match_id}', 'kind': 'match', 'match_id': match_id}
+                                             for match_id in matches_id], ordered=False)
+        except Exception as e:  # already pending from an earlier run
+            logging.debug(e)
+
+    def matches_done(self, matches_id: list) -> None:
+        self.collection.delete_many({'_id': {'$in': [f'match:{match_id}' for match_id in matches_id]}})
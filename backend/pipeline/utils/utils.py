@@ -7,12 +7,25 @@ import csv
 import json
 # import compress_json
 
+from pymongo import ASCENDING, DESCENDING, MongoClient, ReplaceOne
+from pymongo.errors import BulkWriteError
+
 from .configuration import settings
 from .logger import logging
 
 ASSETS_DIR = settings.assets_dir
 SERVER = settings.server
 
+# Puuids per `$in` query and documents per cursor batch of the league matches loader
+PUUID_CHUNK_SIZE: int = 500
+CURSOR_BATCH_SIZE: int = 1000
+# Match ids per `$in` query when loading or deleting by id
+ID_CHUNK_SIZE: int = 10000
+# Code of the write errors of an `_id` already stored
+DUPLICATE_KEY_ERROR: int = 11000
+
+_mongo_clients: dict = {}
+
 
 def trace(func):
     @wraps(func)
@@ -93,6 +106,20 @@ def load_matches(df, server=SERVER):
     return matches_asset
 
 
+def get_mongo_client(uri=None):
+    """MongoClient shared by the whole process, one connection pool for every task."""
+    uri = uri or settings.db_uri
+    if uri not in _mongo_clients:
+        _mongo_clients[uri] = MongoClient(uri)
+    return _mongo_clients[uri]
+
+
+def close_mongo_clients():
+    for client in _mongo_clients.values():
+        client.close()
+    _mongo_clients.clear()
+
+
 def read_collection_db(collection, select={}):
     try:
         return collection.find({}, select)
@@ -110,6 +137,23 @@ def load_matches_db(collection, select={}):
     return matches_asset
 
 
+def find_existing_ids_db(collection, ids):
+    """Ids already stored in collection, answered from the `_id` index.
+
+    Args:
+        collection (Collection): Collection keyed by the ids.
+        ids (list): Ids to look up, a batch such as one matchlist.
+
+    Returns:
+        set: The subset of ids found.
+    """
+    try:
+        return {doc['_id'] for doc in collection.find({'_id': {'$in': list(ids)}}, {'_id': 1})}
+    except Exception as e:
+        logging.error(e)
+        return set()
+
+
 def find_collection_db(collection, key, value, select={}):
     ''' { "info.participants.puuid": value, 'game_version': {'$regex': LATEST_RELEASE} } '''
     try:
@@ -129,32 +173,225 @@ def find_matches_db(collection, puuid, select={}):
     return matches_asset
 
 
-def load_league_matches_db(collection, summoners_df, select={}):
-    matches_asset = []
-    for _, summoner in summoners_df.iterrows():
-        match_asset = find_matches_db(collection, summoner['puuid'], select)
+def iter_league_matches_db(collection, puuids, select={}, query={}, chunk_size=PUUID_CHUNK_SIZE,
+                           batch_size=CURSOR_BATCH_SIZE):
+    """Stream the matches played by any of puuids, each match once.
 
-        if match_asset:
-            matches_asset.extend(match_asset)
+    Puuids are sent by chunks of `chunk_size` with `$in`. A chunk's query also
+    excludes, with `$nin`, matches of earlier chunks' puuids, so Mongo never
+    returns a match twice. Results are streamed from the cursor
+    `batch_size` documents per round trip.
 
+    Args:
+        collection (Collection): `{server}_matches_detail` collection.
+        puuids (list): Summoners puuids.
+        select (dict, optional): Projection. Defaults to {}.
+        query (dict, optional): Extra match filter run by Mongo, e.g. on `info.game_version`. Defaults to {}.
+        chunk_size (int, optional): Puuids per query. Defaults to PUUID_CHUNK_SIZE.
+        batch_size (int, optional): Documents per cursor batch. Defaults to CURSOR_BATCH_SIZE.
+
+    Yields:
+        dict: Matches played by any of the puuids and matching query.
+    """
+    puuids = list(puuids)
+    try:
+        for start in range(0, len(puuids), chunk_size):
+            conditions: list = [{'info.participants.puuid': {'$in': puuids[start:start + chunk_size]}}]
+            if start:
+                conditions.append({'info.participants.puuid': {'$nin': puuids[:start]}})
+            yield from collection.find({'$and': conditions + [query]}, select, batch_size=batch_size)
+    except Exception as e:
+        logging.error(e)
+
+
+def load_league_matches_db(collection, summoners_df, select={}, query={}):
+    """Load the matches of a league's summoners, each match once.
+
+    Args:
+        collection (Collection): `{server}_matches_detail` collection.
+        summoners_df (DataFrame): League summoners, with a `puuid` column.
+        select (dict, optional): Projection. Defaults to {}.
+        query (dict, optional): Extra match filter run by Mongo, e.g. on `info.game_version`. Defaults to {}.
+
+    Returns:
+        list: Matches played by any of the summoners and matching query.
+    """
+    if 'puuid' not in summoners_df:
+        return []
+    return list(iter_league_matches_db(collection, summoners_df['puuid'].tolist(), select, query))
+
+
+def load_matches_by_id_db(collection, ids, select={}, chunk_size=ID_CHUNK_SIZE):
+    """Load matches by `_id`, `chunk_size` ids per query.
+
+    Returns:
+        list: The matches found, in no particular order.
+    """
+    matches_asset: list = []
+    try:
+        for start in range(0, len(ids), chunk_size):
+            matches_asset.extend(collection.find(
+                {'_id': {'$in': ids[start:start + chunk_size]}}, select, batch_size=CURSOR_BATCH_SIZE))
+    except Exception as e:
+        logging.error(e)
     return matches_asset
 
 
-def write_collection_db(data, collection, update=False):
+def delete_matches_db(collection, matches_id, chunk_size=ID_CHUNK_SIZE):
+    """Delete the flattened rows of matches, `chunk_size` match ids per request."""
+    try:
+        for start in range(0, len(matches_id), chunk_size):
+            collection.delete_many({'match_id': {'$in': matches_id[start:start + chunk_size]}})
+    except Exception as e:
+        logging.error(e)
+
+
+def ensure_matches_indexes_db(collection):
+    """Create the indexes of the match filters on a `{server}_matches_detail` collection.
+
+    Cheap once they exist, Mongo skips indexes already built.
+    """
+    try:
+        collection.create_index([('info.participants.puuid', ASCENDING), ('info.game_datetime', DESCENDING)],
+                                name='participants_puuid_game_datetime')
+        collection.create_index([('info.game_version', ASCENDING), ('info.queue_id', ASCENDING),
+                                 ('info.game_datetime', DESCENDING)],
+                                name='game_version_queue_id_game_datetime')
+    except Exception as e:
+        logging.error(e)
+
+
+def write_collection_db(data, collection, update=False, keep_previous=True):
+    """Replace the documents of collection by data, in one step for readers.
+
+    Data is written to `{name}_staging` with the indexes of collection, which
+    is then renamed over the live collection. Readers never see a partially
+    written collection, a failed insert leaves the live one as it was. With
+    keep_previous the live collection is renamed away first, so it is briefly
+    missing between the two renames.
+
+    Args:
+        data (list): Documents.
+        collection (Collection): Live collection.
+        update (bool, optional): Keep the documents already in collection too. Defaults to False.
+        keep_previous (bool, optional): Keep the replaced collection as `{name}_previous`,
+            see `rollback_collection_db`. Defaults to True.
+    """
     try:
         if update:  # Extend collection on update mode
             old_data = read_collection_db(collection)
             data.extend(old_data)
 
-        collection.drop()
-        collection.insert_many(data, ordered=False)
+        database = collection.database
+        staging = database[f'{collection.name}_staging']
+        staging.drop()
+        if data:
+            try:
+                staging.insert_many(data, ordered=False)
+            except BulkWriteError as e:  # never publish a partial write
+                logging.error(e)
+                staging.drop()
+                return
+        else:
+            database.create_collection(staging.name)
+        live: bool = collection.name in database.list_collection_names()
+        if live:  # the rename keeps the indexes of staging only
+            for name, index in collection.index_information().items():
+                if name != '_id_':
+                    options = {key: value for key, value in index.items() if key not in ('key', 'v', 'ns')}
+                    staging.create_index(index['key'], name=name, **options)
+        if keep_previous and live:
+            collection.rename(f'{collection.name}_previous', dropTarget=True)
+        staging.rename(collection.name, dropTarget=True)
+    except Exception as e:
+        logging.error(e)
+
+
+def rollback_collection_db(collection):
+    """Put back the documents replaced by the last `write_collection_db`, in one step for readers."""
+    try:
+        collection.database[f'{collection.name}_previous'].rename(collection.name, dropTarget=True)
     except Exception as e:
         logging.error(e)
 
 
 def insert_collection_db(data, collection):
+    """Insert documents in one unordered bulk write.
+
+    Args:
+        data (list): Documents, each holding its `_id`.
+        collection (Collection): Target collection.
+
+    Returns:
+        list: `_id` of the documents now in collection, already stored (duplicate key) ones included.
+    """
     try:
         collection.insert_many(data, ordered=False)
+        return [doc['_id'] for doc in data]
+    except BulkWriteError as e:
+        failed: set = {error['index'] for error in e.details.get('writeErrors', [])
+                       if error.get('code') != DUPLICATE_KEY_ERROR}
+        if failed:
+            logging.error(e)
+        return [doc['_id'] for index, doc in enumerate(data) if index not in failed]
+    except Exception as e:
+        logging.error(e)
+        return []
+
+
+def upsert_collection_db(data, collection, key='_id', prune=False):
+    """Replace or insert documents by `key` in one unordered bulk write.
+
+    Unlike `write_collection_db` documents missing from data are kept unless
+    pruned, and re-running the same write is harmless.
+
+    Args:
+        data (list): Documents, each holding `key`.
+        collection (Collection): Target collection.
+        key (str, optional): Unique field to match on. Defaults to '_id'.
+        prune (bool, optional): Delete documents whose key is not in data. Defaults to False.
+    """
+    try:
+        if data:
+            collection.bulk_write(
+                [ReplaceOne({key: doc[key]}, doc, upsert=True) for doc in data], ordered=False)
+        if prune and data:  # never prune to an empty collection
+            collection.delete_many({key: {'$nin': [doc[key] for doc in data]}})
+    except Exception as e:
+        logging.error(e)
+
+
+def load_cursors_db(collection, puuids, matches_collection):
+    """Load the scrape cursor of each puuid.
+
+    A cursor points at the newest match of the puuid's last matchlist. Its
+    game_datetime is only known once that match is stored, so a cursor whose
+    match is still pending gives no time filter and nothing is skipped.
+
+    Returns:
+        dict: puuid -> {'match_id', 'games': wins + losses at last request, 'game_datetime' (ms) if stored}
+    """
+    try:
+        cursors: dict = {cursor['_id']: cursor for cursor in collection.find({'_id': {'$in': list(puuids)}})}
+        matches_id: list = [cursor['match_id'] for cursor in cursors.values() if cursor.get('match_id')]
+        game_datetimes: dict = {match['_id']: match['info']['game_datetime'] for match in matches_collection.find(
+            {'_id': {'$in': matches_id}}, {'info.game_datetime': 1})}
+        for cursor in cursors.values():
+            if cursor.get('match_id') in game_datetimes:
+                cursor['game_datetime'] = game_datetimes[cursor['match_id']]
+        return cursors
+    except Exception as e:
+        logging.error(e)
+        return {}
+
+
+def set_cursor_db(collection, puuid, match_id=None, games=None):
+    """Save the newest match id and the wins + losses count of a requested matchlist."""
+    cursor: dict = {key: value for key, value in [('match_id', match_id), ('games', games)]
+                    if value is not None}
+    try:
+        if cursor:
+            collection.update_one({'_id': puuid}, {'$set': cursor}, upsert=True)
     except Exception as e:
         logging.error(e)
 
@@ -10,7 +10,7 @@ fi
 # A POSIX variable
 OPTIND=1         # Reset in case getopts has been used previously in the shell.
 
-usage="$(basename "$0") [-h] [-nri] [-mgc] [-a] -- Team Fight Tactic pipeline helper
+usage="$(basename "$0") [-h] [-nri] [-mgc] [-a] [-d] -- Team Fight Tactic pipeline helper
 
 where:
     -h  show this help text
@@ -20,7 +20,8 @@ where:
     -m  run above for master league (default=0)
     -g  run above for grandmaster league (default=0)
     -c  run above for challenger league (default=1)
-    -a  run all above (default=0)"
+    -a  run all above (default=0)
+    -d  keep scraping all leagues in daemon mode, until stopped (default=0)"
 
 # Initialize our own variables:
 run_new=0
@@ -29,8 +30,9 @@ run_infer=0
 run_master=0
 run_grandmaster=0
 run_challenger=1
+run_daemon=0
 
-while getopts "h?anrimgc" opt; do
+while getopts "h?anrimgcd" opt; do
   case ${opt} in
     h|\?)
       echo "$usage"
@@ -55,6 +57,8 @@ while getopts "h?anrimgc" opt; do
         ;;
     c)  run_challenger=1
         ;;
+    d)  run_daemon=1
+        ;;
     :)  printf "missing argument for -%s\n" "$OPTARG" >&2
         echo "$usage" >&2
         exit 1
@@ -102,6 +106,11 @@ if [[ $run_refresh = 1 ]]; then
     fi
 fi
 
+if [[ $run_daemon = 1 ]]; then
+    echo "Scraping for new matches in daemon mode."
+    python scrape_db.py -c configs/daemon.json
+fi
+
 if [[ $run_infer = 1 ]]; then
     echo "Transforming and infering matches."
     if [[ $run_master = 1 ]]; then